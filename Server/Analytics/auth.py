@@ -0,0 +1,30 @@
+import os
+
+import jwt
+from fastapi import HTTPException, Request
+
+# Tokens are issued by the Auth-Service (signToken in jwtUtils.ts) with the
+# same secret; the payload carries the user id.
+JWT_SECRET = os.environ.get("JWT_SECRET")
+JWT_ALGORITHMS = ["HS256"]
+
+
+def get_current_user_id(request: Request) -> int:
+    # Prefer cookie first, fallback to Bearer token (same order as protect.ts)
+    token = request.cookies.get("jwt")
+    authorization = request.headers.get("authorization", "")
+    if not token and authorization.startswith("Bearer"):
+        token = authorization.split(" ", 1)[-1].strip()
+
+    if not token:
+        raise HTTPException(status_code=401, detail="Not logged in. Please login to get access.")
+    if not JWT_SECRET:
+        print("JWT_SECRET is not defined. Cannot verify token.")
+        raise HTTPException(status_code=500, detail="Authentication is not configured")
+
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=JWT_ALGORITHMS)
+        return int(payload["id"])
+    except (jwt.InvalidTokenError, KeyError, TypeError, ValueError) as e:
+        print(f"JWT Verification Error: {e}")
+        raise HTTPException(status_code=401, detail="Invalid token. Please login again.")
@@ -0,0 +1,228 @@
+"""Per-user index of which items are bought together.
+
+An order is the set of items recorded under one orderID on one saleDate.
+For each user the index keeps a sparse, symmetric items x items matrix C
+where C[a, b] is the number of orders containing both a and b and C[a, a]
+the number of orders containing a. With B the binary orders x items matrix,
+C = B.T @ B, so the whole history is counted in one sparse product.
+
+Only rows the sales rollups have folded in (and therefore given a saleDate)
+are counted. Newer rows are added once the rollup watermark passes them: the
+orders they touch are counted again with and without the earlier rows of the
+same order, and the difference is added to C. Like the rollups, each load
+re-reads ROLLUP_OVERLAP ids below the watermark for rows that committed out
+of order, and skips the ids already counted. Related items for a product
+are then one sparse row of C instead of a self-join over transactions.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import bindparam, text
+
+from Analytics.metrics import BASKET_UPDATE_SECONDS
+from Analytics.rollups import ROLLUP_OVERLAP, folded_watermark
+
+BASKET_CACHE_USERS = int(os.environ.get("ANALYTICS_BASKET_CACHE_USERS", 200))
+# Seconds between checks for newly folded transactions.
+BASKET_REFRESH_INTERVAL = float(os.environ.get("ANALYTICS_BASKET_REFRESH_INTERVAL", 5))
+BASKET_LOAD_CHUNK = 100000
+
+LOAD_SQL = """
+    SELECT id, "saleDate", "orderID", item
+    FROM transactions
+    WHERE "UserId" = :user_id AND id > :after AND id <= :upto AND "saleDate" IS NOT NULL
+    ORDER BY id
+    LIMIT :limit
+"""
+# Rows of the orders a new batch touches; narrowed to the exact
+# (saleDate, orderID) pairs, and to the rows already counted, afterwards.
+ORDER_ROWS_SQL = text("""
+    SELECT id, "saleDate", "orderID", item
+    FROM transactions
+    WHERE "UserId" = :user_id AND id <= :upto
+      AND "saleDate" IN :days AND "orderID" IN :orders
+""").bindparams(bindparam("days", expanding=True), bindparam("orders", expanding=True))
+
+
+def item_key(name):
+    # Ledger spellings differ in case and spacing only as often as not.
+    return " ".join(name.lower().split())
+
+
+def _cooccurrence(baskets, size):
+    """B.T @ B for a list of sets of item codes."""
+    rows = np.repeat(np.arange(len(baskets)), [len(basket) for basket in baskets])
+    columns = np.fromiter((code for basket in baskets for code in basket), dtype=np.int32, count=len(rows))
+    incidence = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)),
+                                  shape=(len(baskets), size))
+    return (incidence.T @ incidence).tocsr()
+
+
+def _resized(matrix, size):
+    if matrix.shape[0] == size:
+        return matrix
+    matrix = matrix.tocoo()
+    return sparse.csr_matrix((matrix.data, (matrix.row, matrix.col)), shape=(size, size))
+
+
+class UserBaskets:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.watermark = 0
+        # Ids counted within ROLLUP_OVERLAP of the watermark, not to be counted twice.
+        self.recent_ids = set()
+        self.orders = 0
+        self.items = []
+        self.item_codes = {}
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+
+    def _code(self, name):
+        key = item_key(name)
+        code = self.item_codes.get(key)
+        if code is None:
+            code = self.item_codes[key] = len(self.items)
+            self.items.append(name.strip())
+        return code
+
+    def _baskets(self, rows):
+        baskets = {}
+        for day, order_id, name in rows:
+            baskets.setdefault((day, order_id), set()).add(self._code(name))
+        return baskets
+
+    def add(self, rows, earlier_rows=()):
+        """Counts rows of (saleDate, orderID, item), given the already counted
+        rows of the orders they belong to."""
+        after = self._baskets(rows)
+        before = self._baskets(
+            (day, order_id, name) for day, order_id, name in earlier_rows if (day, order_id) in after
+        )
+        for key, basket in before.items():
+            after[key] |= basket
+        size = len(self.items)
+        delta = _cooccurrence(list(after.values()), size)
+        if before:
+            delta = delta - _cooccurrence(list(before.values()), size)
+        self.matrix = _resized(self.matrix, size) + delta
+        self.matrix.eliminate_zeros()
+        self.orders += len(after) - len(before)
+
+    def related_items(self, name, limit=10, by="count"):
+        """Items bought in the same orders as `name`, by co-occurring orders
+        or by lift (how much more often than if bought independently)."""
+        code = self.item_codes.get(item_key(name))
+        if code is None:
+            return {"item": name, "orders": 0, "related": []}
+        row = self.matrix.getrow(code)
+        orders = int(self.matrix[code, code])
+        others = row.indices != code
+        codes, counts = row.indices[others], row.data[others].astype(np.float64)
+        support = self.matrix.diagonal()[codes].astype(np.float64)
+        lift = counts * self.orders / (orders * support) if orders else np.zeros(len(codes))
+        top = np.lexsort((-counts, -lift) if by == "lift" else (-lift, -counts))[:limit]
+        return {
+            "item": self.items[code],
+            "orders": orders,
+            "related": [
+                {
+                    "item": self.items[codes[i]],
+                    "orders": int(counts[i]),
+                    "confidence": round(float(counts[i] / orders), 4),
+                    "lift": round(float(lift[i]), 3),
+                }
+                for i in top
+            ],
+        }
+
+    def top_pairs(self, limit=20):
+        """The pairs of items found together in the most orders."""
+        pairs = sparse.triu(self.matrix, k=1).tocoo()
+        top = np.argsort(-pairs.data, kind="stable")[:limit]
+        support = self.matrix.diagonal()
+        return [
+            {
+                "items": [self.items[pairs.row[i]], self.items[pairs.col[i]]],
+                "orders": int(pairs.data[i]),
+                "lift": round(float(pairs.data[i]) * self.orders
+                              / (int(support[pairs.row[i]]) * int(support[pairs.col[i]])), 3),
+            }
+            for i in top
+        ]
+
+
+class BasketIndex:
+    def __init__(self, cache_users=None):
+        self.cache_users = cache_users or BASKET_CACHE_USERS
+        self._users = OrderedDict()
+        self._watermark = 0
+        self._watermark_at = 0.0
+
+    async def _rollup_watermark(self, db):
+        if time.monotonic() - self._watermark_at >= BASKET_REFRESH_INTERVAL:
+            self._watermark = await folded_watermark(db)
+            self._watermark_at = time.monotonic()
+        return self._watermark
+
+    async def get(self, db, user_id):
+        """Returns the user's index, building or extending it first."""
+        baskets = self._users.get(user_id)
+        if baskets is None:
+            baskets = self._users[user_id] = UserBaskets(user_id)
+            while len(self._users) > self.cache_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user_id)
+
+        async with baskets.lock:
+            upto = await self._rollup_watermark(db)
+            if upto > baskets.watermark and time.monotonic() - baskets.checked_at >= BASKET_REFRESH_INTERVAL:
+                kind = "update" if baskets.watermark else "build"
+                with BASKET_UPDATE_SECONDS.labels(kind).time():
+                    await self._load(db, baskets, upto)
+        return baskets
+
+    async def _load(self, db, baskets, upto):
+        rows = []
+        ids = set()
+        after = max(0, baskets.watermark - ROLLUP_OVERLAP)
+        while True:
+            chunk = (await db.execute(text(LOAD_SQL), {
+                "user_id": baskets.user_id, "after": after, "upto": upto, "limit": BASKET_LOAD_CHUNK,
+            })).all()
+            for row in chunk:
+                if row[0] not in baskets.recent_ids:
+                    ids.add(row[0])
+                    rows.append(row[1:])
+            if len(chunk) < BASKET_LOAD_CHUNK:
+                break
+            after = chunk[-1][0]
+
+        earlier_rows = []
+        if rows and baskets.watermark:
+            # A late row can sit below the old watermark, so the counted rows
+            # are all those up to upto except the ones read just now.
+            earlier_rows = [row[1:] for row in (await db.execute(ORDER_ROWS_SQL, {
+                "user_id": baskets.user_id, "upto": upto,
+                "days": sorted({day for day, _, _ in rows}),
+                "orders": sorted({order_id for _, order_id, _ in rows}),
+            })).all() if row[0] not in ids]
+        if rows:
+            baskets.add(rows, earlier_rows)
+        baskets.watermark = upto
+        baskets.recent_ids = {i for i in (*baskets.recent_ids, *ids) if i > upto - ROLLUP_OVERLAP}
+        baskets.checked_at = time.monotonic()
+
+    def mark_stale(self, user_id):
+        # Makes the next request look for new rows straight away.
+        baskets = self._users.get(user_id)
+        if baskets is not None:
+            baskets.checked_at = 0.0
+        self._watermark_at = 0.0
+
+
+basket_index = BasketIndex()
@@ -0,0 +1,343 @@
+"""Load-tests the analytics endpoints at several ledger sizes.
+
+    python Analytics/benchmarks/analytics_benchmark.py --scales 100000,1000000 --concurrency 1,8,32
+    python Analytics/benchmarks/analytics_benchmark.py --embedded --scales 100000    (throwaway PostgreSQL)
+
+Each scale is seeded with the bulk transaction generator into a dedicated
+database (analytics_bench, dropped and recreated) on the server given by
+--server-url or DATABASE_URL, or on a temporary server started with pgserver
+(--embedded). The FastAPI app is then driven in-process at every concurrency
+level. Each run writes a JSON report (p50/p95/p99 latency, throughput and
+database time per endpoint) so schema or query changes can be compared.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import psycopg2
+from sqlalchemy.engine import make_url
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from Analytics.bulk_transaction_generator import GENERATOR_BATCH_SIZE, generate  # noqa: E402
+
+BENCH_DATABASE = "analytics_bench"
+ENDPOINTS = ["key-metrics", "monthly-sales", "daily-sales", "item-sales"]
+
+# The tables the analytics service reads, as the Auth-Service migrations leave
+# them; users only carries the id the foreign keys need.
+SCHEMA_SQL = """
+CREATE TABLE users (id serial PRIMARY KEY);
+CREATE TABLE transactions (
+    id serial PRIMARY KEY,
+    "UserId" integer NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    date varchar(255) NOT NULL,
+    item varchar(255) NOT NULL,
+    "sellingPrice" varchar(255) NOT NULL,
+    "createdAt" timestamptz NOT NULL,
+    "updatedAt" timestamptz NOT NULL,
+    "orderID" varchar(255) NOT NULL DEFAULT '0',
+    quantity varchar(255) NOT NULL DEFAULT '1',
+    "quantityValue" decimal(12, 3),
+    "quantityUnit" varchar(8),
+    "sellingPriceValue" decimal(12, 2),
+    "saleDate" date
+);
+CREATE INDEX transactions_user_sale_date_idx ON transactions ("UserId", "saleDate");
+CREATE UNIQUE INDEX transactions_user_order_item_date_key ON transactions ("UserId", "orderID", item, date);
+CREATE TABLE daily_sales (
+    "UserId" integer NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    day date NOT NULL,
+    revenue decimal(14, 2) NOT NULL DEFAULT 0,
+    orders integer NOT NULL DEFAULT 0,
+    "lineItems" integer NOT NULL DEFAULT 0,
+    PRIMARY KEY ("UserId", day)
+);
+CREATE TABLE daily_item_sales (
+    "UserId" integer NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    day date NOT NULL,
+    item varchar(255) NOT NULL,
+    revenue decimal(14, 2) NOT NULL DEFAULT 0,
+    "lineItems" integer NOT NULL DEFAULT 0,
+    PRIMARY KEY ("UserId", day, item)
+);
+CREATE TABLE rollup_state (
+    name varchar(255) PRIMARY KEY,
+    "lastTransactionId" integer NOT NULL DEFAULT 0,
+    "updatedAt" timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def summarize(samples):
+    values = np.array(samples, dtype=np.float64)
+    if not len(values):
+        return None
+    return {
+        "count": int(len(values)),
+        "mean_ms": round(float(values.mean()) * 1000, 3),
+        "p50_ms": round(float(np.percentile(values, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(values, 95)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(values, 99)) * 1000, 3),
+        "max_ms": round(float(values.max()) * 1000, 3),
+    }
+
+
+def create_bench_database(server_url):
+    """Drops and recreates the benchmark database; returns its URL."""
+    conn = psycopg2.connect(server_url)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DATABASE}")
+            cursor.execute(f"CREATE DATABASE {BENCH_DATABASE}")
+    finally:
+        conn.close()
+    url = make_url(server_url).set(database=BENCH_DATABASE)
+    return url.render_as_string(hide_password=False)
+
+
+def create_schema(database_url, users):
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(SCHEMA_SQL)
+            cursor.execute("INSERT INTO users (id) SELECT generate_series(1, %s)", (users,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def server_version(database_url):
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SHOW server_version")
+            return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def build_rollups(chunk_size=20000):
+    """Recomputes the rollups for every seeded day and moves the watermark past
+    the seeded rows, so requests only time the read path. The generator fills
+    the numeric columns, so the per-row normalization of a full refresh is
+    skipped."""
+    from sqlalchemy import text
+
+    from Analytics.database import SessionLocal
+    from Analytics.rollups import ROLLUP_NAME, recompute_days
+
+    db = SessionLocal()
+    try:
+        keys = db.execute(text('SELECT DISTINCT "UserId", "saleDate" FROM transactions')).all()
+        for start in range(0, len(keys), chunk_size):
+            recompute_days(db, [tuple(key) for key in keys[start:start + chunk_size]])
+            db.commit()
+        db.execute(
+            text("INSERT INTO rollup_state (name, \"lastTransactionId\", \"updatedAt\") "
+                 "SELECT :name, COALESCE(max(id), 0), now() FROM transactions "
+                 "ON CONFLICT (name) DO UPDATE SET \"lastTransactionId\" = EXCLUDED.\"lastTransactionId\""),
+            {"name": ROLLUP_NAME},
+        )
+        db.commit()
+        db.execute(text("ANALYZE"))
+        sizes = db.execute(text(
+            "SELECT relname, pg_total_relation_size(oid) FROM pg_class "
+            "WHERE relname IN ('transactions', 'daily_sales', 'daily_item_sales')"
+        )).all()
+        return {name: round(size / 2**20, 2) for name, size in sizes}
+    finally:
+        db.close()
+
+
+def query_seconds(endpoint):
+    from prometheus_client import REGISTRY
+
+    labels = {"endpoint": endpoint}
+    return (REGISTRY.get_sample_value("analytics_query_seconds_sum", labels) or 0.0,
+            REGISTRY.get_sample_value("analytics_query_seconds_count", labels) or 0.0)
+
+
+async def drive(app, endpoint, tokens, requests, concurrency, seed):
+    """Sends `requests` GETs to one endpoint, at most `concurrency` at a time,
+    as randomly chosen users. Returns (latencies, errors, wall seconds)."""
+    import httpx
+
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, len(tokens), size=requests)
+    queue = asyncio.Queue()
+    for user in users:
+        queue.put_nowait(int(user))
+    latencies, errors = [], 0
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            user = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.get(f"/analytics/{endpoint}", headers={"Authorization": f"Bearer {tokens[user]}"})
+            except Exception as e:
+                print(f"Error requesting /analytics/{endpoint}: {e}")
+                errors += 1
+                continue
+            # Only successful requests are timed, so failures do not skew the percentiles.
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return latencies, errors, wall
+
+
+async def run_scale(app, endpoints, tokens, concurrency_levels, requests, warmup, seed):
+    results = []
+    for concurrency in concurrency_levels:
+        for endpoint in endpoints:
+            await drive(app, endpoint, tokens, warmup, concurrency, seed)
+            db_sum, db_count = query_seconds(endpoint)
+            latencies, errors, wall = await drive(app, endpoint, tokens, requests, concurrency, seed + 1)
+            db_sum_after, db_count_after = query_seconds(endpoint)
+            queries = db_count_after - db_count
+            result = {
+                "endpoint": endpoint,
+                "concurrency": concurrency,
+                "requests": len(latencies) + errors,
+                "errors": errors,
+                "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+                "latency": summarize(latencies),
+                "db_ms_per_request": round((db_sum_after - db_sum) / queries * 1000, 3) if queries else None,
+            }
+            results.append(result)
+            latency = result["latency"]
+            percentiles = f"p50 {latency['p50_ms']:.1f} ms  p99 {latency['p99_ms']:.1f} ms" if latency else "p50 n/a  p99 n/a"
+            print(f"  {endpoint:>14} c={concurrency:<3} {result['throughput_rps']:>9} req/s  {percentiles}  "
+                  f"db {result['db_ms_per_request']} ms" + (f"  errors {errors}" if errors else ""))
+    return results
+
+
+async def run_scales(app, args, scales, concurrency_levels, endpoints, tokens, database_url):
+    # One event loop for the whole run: the app's connection pool and locks
+    # belong to it. Seeding blocks the loop, which is idle at that point.
+    user_ids = list(range(1, args.users + 1))
+    report_scales = []
+    seeded = 0
+    next_batch = 0
+    for scale in scales:
+        print(f"Seeding {scale} transactions...")
+        started = time.perf_counter()
+        rows = scale - seeded
+        generate(rows, user_ids, args.start, args.days, seed=args.seed, workers=args.workers,
+                 database_url=database_url, first_batch=next_batch)
+        next_batch += math.ceil(rows / GENERATOR_BATCH_SIZE)
+        seeded = scale
+        seed_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        table_mb = build_rollups()
+        rollup_seconds = time.perf_counter() - started
+
+        results = await run_scale(app, endpoints, tokens, concurrency_levels, args.requests, args.warmup, args.seed)
+        report_scales.append({
+            "transactions": scale,
+            "seed_s": round(seed_seconds, 2),
+            "rollup_build_s": round(rollup_seconds, 2),
+            "table_mb": table_mb,
+            "results": results,
+        })
+    return report_scales
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default="100000,1000000", help="comma-separated transaction counts")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--start', type=datetime.date.fromisoformat, default=datetime.date(2024, 1, 1))
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--concurrency', default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=200, help="timed requests per endpoint and level")
+    parser.add_argument('--warmup', type=int, default=10, help="untimed requests per endpoint and level")
+    parser.add_argument('--endpoints', default=",".join(ENDPOINTS))
+    parser.add_argument('--workers', type=int, default=None, help="generator processes (default: one per CPU)")
+    parser.add_argument('--cache', action='store_true', help="keep the response cache on (default: off)")
+    parser.add_argument('--server-url', default=os.environ.get("DATABASE_URL"),
+                        help=f"PostgreSQL server to create the {BENCH_DATABASE} database on")
+    parser.add_argument('--embedded', action='store_true', help="start a temporary PostgreSQL with pgserver")
+    parser.add_argument('--output', help="report path (default: benchmarks/results/analytics-<timestamp>.json)")
+    args = parser.parse_args()
+
+    scales = sorted(int(scale) for scale in args.scales.split(","))
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",")]
+
+    if args.embedded:
+        try:
+            import pgserver
+        except ImportError:
+            sys.exit("--embedded needs the pgserver package (pip install pgserver).")
+        server = pgserver.get_server(tempfile.mkdtemp(prefix="analytics-bench-"), cleanup_mode="delete")
+        server_url = server.get_uri()
+    elif args.server_url:
+        server_url = args.server_url
+    else:
+        sys.exit("Give --server-url (or set DATABASE_URL), or run with --embedded.")
+
+    database_url = create_bench_database(server_url)
+    create_schema(database_url, args.users)
+    # The app reads its settings when imported, so they are set first.
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("JWT_SECRET", "analytics-benchmark")
+    if not args.cache:
+        os.environ["ANALYTICS_CACHE_TTL"] = "0"
+
+    import jwt
+
+    from Analytics.main import app
+
+    tokens = [jwt.encode({"id": user_id}, os.environ["JWT_SECRET"], algorithm="HS256")
+              for user_id in range(1, args.users + 1)]
+
+    report_scales = asyncio.run(run_scales(app, args, scales, concurrency_levels, endpoints, tokens, database_url))
+
+    import fastapi
+    import sqlalchemy
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: (v.isoformat() if isinstance(v, datetime.date) else v)
+                   for k, v in vars(args).items() if k not in ('output', 'server_url')},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "postgresql": server_version(database_url),
+            "fastapi": fastapi.__version__,
+            "sqlalchemy": sqlalchemy.__version__,
+            "db_pool_size": os.environ.get("DB_POOL_SIZE", "default"),
+        },
+        "scales": report_scales,
+    }
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         f"analytics-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""Generates large synthetic ledgers for load testing.
+
+Transactions are built in NumPy batches: orders of 2-7 distinct items spread
+over many users and a date span, with weekly and yearly seasonality, a
+gentle growth trend, per-user volume and per-item popularity. Batch n always
+comes from the same seed, so a run is reproducible whatever the number of
+workers. Each worker process streams its batches into PostgreSQL with COPY,
+or writes them to CSV/Parquet files instead.
+
+    python -m Analytics.bulk_transaction_generator --rows 20000000 --users 500 \\
+        --start 2024-01-01 --days 730 --workers 8                 (run from Server/)
+    python -m Analytics.bulk_transaction_generator --rows 1000000 --output parquet --out-dir data/
+
+Rows are inserted with the numeric columns already filled; rebuild the
+rollups afterwards with: python -m Analytics.rollups --rebuild
+"""
+import datetime
+import io
+import math
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+
+from Analytics.dummy_transaction_generator import format_quantity, items
+from Analytics.normalize import parse_quantity
+
+GENERATOR_BATCH_SIZE = int(os.environ.get("GENERATOR_BATCH_SIZE", 200000))
+MIN_ORDER_ITEMS, MAX_ORDER_ITEMS = 2, 7
+# Zipf exponents: a few items sell most, a few shops record most orders.
+ITEM_POPULARITY_SKEW = 1.1
+USER_VOLUME_SKEW = 0.8
+
+# Columns that are the same for every line of an order, then the per-line ones.
+ORDER_COLUMNS = ["UserId", "date", "createdAt", "updatedAt", "orderID", "saleDate"]
+LINE_COLUMNS = ["item", "quantity", "quantityValue", "quantityUnit", "sellingPrice", "sellingPriceValue"]
+COLUMNS = ORDER_COLUMNS + LINE_COLUMNS
+COPY_SQL = "COPY transactions ({}) FROM STDIN WITH (FORMAT csv)".format(
+    ", ".join(f'"{column}"' for column in COLUMNS))
+
+ITEM_NAMES = np.array(list(items), dtype=object)
+MAX_OPTIONS = max(len(item["unit_options"]) for item in items.values())
+# Per item and unit option: option count, quantity text, canonical quantity,
+# line price and the LINE_COLUMNS part of a CSV line.
+OPTION_COUNTS = np.array([len(item["unit_options"]) for item in items.values()])
+QUANTITY_TEXT = np.empty((len(items), MAX_OPTIONS), dtype=object)
+QUANTITY_VALUES = np.zeros((len(items), MAX_OPTIONS))
+LINE_PRICES = np.zeros((len(items), MAX_OPTIONS), dtype=np.int64)
+ITEM_UNITS = np.empty(len(items), dtype=object)
+LINE_TEXT = np.empty((len(items), MAX_OPTIONS), dtype=object)
+for i, (name, item) in enumerate(items.items()):
+    for j, option in enumerate(item["unit_options"]):
+        QUANTITY_TEXT[i, j] = format_quantity(option, item["unit"])
+        value, ITEM_UNITS[i] = parse_quantity(QUANTITY_TEXT[i, j])
+        QUANTITY_VALUES[i, j] = round(value, 3)
+        # Same whole-rupee line total as the dummy generator
+        LINE_PRICES[i, j] = int(option * item["price"])
+        LINE_TEXT[i, j] = ",".join(str(field) for field in (
+            name, QUANTITY_TEXT[i, j], QUANTITY_VALUES[i, j], ITEM_UNITS[i], LINE_PRICES[i, j], LINE_PRICES[i, j])) + "\n"
+
+
+def item_weights(seed):
+    # Popularity follows rank, with the ranking shuffled by the seed.
+    ranks = np.random.default_rng(seed).permutation(len(items)) + 1
+    weights = ranks ** -ITEM_POPULARITY_SKEW
+    return weights / weights.sum()
+
+
+def user_weights(seed, count):
+    ranks = np.random.default_rng([seed, 1]).permutation(count) + 1
+    weights = ranks ** -USER_VOLUME_SKEW
+    return weights / weights.sum()
+
+
+def day_weights(start, days):
+    dates = np.datetime64(start, "D") + np.arange(days)
+    weekday = (dates.astype(np.int64) + 3) % 7  # 0 = Monday
+    day_of_year = (dates - dates.astype("datetime64[Y]")).astype(np.int64)
+    weights = (
+        np.where(weekday >= 5, 1.3, 1.0)                                   # busier weekends
+        * (1 + 0.25 * np.sin(2 * np.pi * (day_of_year - 80) / 365.25))    # yearly season
+        * np.linspace(1.0, 1.5, days)                                      # growth over the span
+    )
+    return weights / weights.sum()
+
+
+def generate_batch(batch, rows, seed, user_ids, start, days):
+    """Draws one batch of `rows` transactions. Returns the item and unit option
+    of every row, the order it belongs to and the user, time and id of every
+    order; to_columns() and to_csv() expand it."""
+    rng = np.random.default_rng([seed, 2, batch])
+
+    # Enough orders to cover the batch; the last one is cut at `rows`.
+    sizes = rng.integers(MIN_ORDER_ITEMS, MAX_ORDER_ITEMS + 1, size=rows // MIN_ORDER_ITEMS + 1)
+    ends = np.cumsum(sizes)
+    orders = int(np.searchsorted(ends, rows)) + 1
+    sizes = sizes[:orders]
+    order_of_row = np.repeat(np.arange(orders), sizes)[:rows]
+    position = np.arange(rows) - np.repeat(ends[:orders] - sizes, sizes)[:rows]
+
+    # Distinct items per order, weighted by popularity (Gumbel top-k).
+    keys = np.log(item_weights(seed)) + rng.gumbel(size=(orders, len(items)))
+    ranked = np.argsort(-keys, axis=1)[:, :MAX_ORDER_ITEMS]
+    item = ranked[order_of_row, position]
+    option = (rng.random(rows) * OPTION_COUNTS[item]).astype(np.int64)
+
+    order_day = np.datetime64(start, "D") + rng.choice(days, size=orders, p=day_weights(start, days))
+    order_time = (order_day.astype("datetime64[s]")
+                  + rng.integers(9 * 3600, 19 * 3600, size=orders).astype("timedelta64[s]"))
+    return {
+        "order_of_row": order_of_row,
+        "item": item,
+        "option": option,
+        "user": rng.choice(np.asarray(user_ids), size=orders, p=user_weights(seed, len(user_ids))),
+        "day": order_day,
+        "time": order_time,
+        # Unique across batches: batch n owns order numbers n * GENERATOR_BATCH_SIZE onwards.
+        "order_id": batch * GENERATOR_BATCH_SIZE + np.arange(orders) + 1,
+    }
+
+
+def _order_text(generated):
+    day = np.datetime_as_string(generated["day"])
+    created = np.char.add(np.char.replace(np.datetime_as_string(generated["time"]), "T", " "), "+05:30")
+    return day, created, generated["order_id"].astype(str)
+
+
+def to_columns(generated):
+    """Expands a generated batch into one array per transactions column."""
+    rows, item, option = generated["order_of_row"], generated["item"], generated["option"]
+    day, created, order_id = _order_text(generated)
+    price = LINE_PRICES[item, option]
+    return {
+        "UserId": generated["user"][rows].astype(np.int32),
+        "date": day[rows],
+        "item": ITEM_NAMES[item],
+        "sellingPrice": price.astype(str),
+        "createdAt": created[rows],
+        "updatedAt": created[rows],
+        "orderID": order_id[rows],
+        "quantity": QUANTITY_TEXT[item, option],
+        "quantityValue": QUANTITY_VALUES[item, option],
+        "quantityUnit": ITEM_UNITS[item],
+        "sellingPriceValue": price,
+        "saleDate": generated["day"][rows],
+    }
+
+
+def to_csv(generated):
+    """Formats a generated batch as CSV lines in ORDER_COLUMNS + LINE_COLUMNS order.
+
+    The text of every order and of every (item, unit option) is built once and
+    each row is the two joined; the catalogue has no commas or quotes, so no
+    field needs quoting."""
+    day, created, order_id = _order_text(generated)
+    user = generated["user"].astype(str)
+    order_text = np.array(
+        [",".join(fields) + "," for fields in zip(user, day, created, created, order_id, day)], dtype=object)
+    return "".join(order_text[generated["order_of_row"]] + LINE_TEXT[generated["item"], generated["option"]])
+
+
+def write_parquet(columns, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pq.write_table(pa.table({column: columns[column] for column in COLUMNS}), path)
+
+
+# State of each worker process, set up by _init_worker.
+_worker = {}
+
+
+def _init_worker(options):
+    _worker.update(options)
+    if options["output"] == "db":
+        import psycopg2
+
+        _worker["conn"] = psycopg2.connect(options["database_url"])
+
+
+def _run_batch(task):
+    batch, rows = task
+    generated = generate_batch(batch, rows, _worker["seed"], _worker["user_ids"], _worker["start"], _worker["days"])
+    output = _worker["output"]
+    if output == "db":
+        conn = _worker["conn"]
+        with conn.cursor() as cursor:
+            cursor.copy_expert(COPY_SQL, io.StringIO(to_csv(generated)))
+        conn.commit()
+    elif output == "csv":
+        with open(os.path.join(_worker["out_dir"], f"transactions-{batch:05d}.csv"), "w", newline="") as f:
+            f.write(",".join(COLUMNS) + "\n")
+            f.write(to_csv(generated))
+    else:
+        write_parquet(to_columns(generated), os.path.join(_worker["out_dir"], f"transactions-{batch:05d}.parquet"))
+    return rows
+
+
+def get_user_ids(database_url, limit):
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM users ORDER BY id LIMIT %s", (limit,))
+            return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def generate(rows, user_ids, start, days, seed=0, workers=None, output="db", out_dir=None,
+             database_url=None, batch_size=None, first_batch=0):
+    """Generates `rows` transactions and returns the number written.
+
+    Batches are numbered from `first_batch`; to add to an earlier run, start
+    after its last batch so order ids stay unique."""
+    batch_size = batch_size or GENERATOR_BATCH_SIZE
+    if batch_size > GENERATOR_BATCH_SIZE:
+        raise ValueError(f"batch size can be at most GENERATOR_BATCH_SIZE ({GENERATOR_BATCH_SIZE})")
+    tasks = [(first_batch + k, min(batch_size, rows - k * batch_size)) for k in range(math.ceil(rows / batch_size))]
+    options = {"seed": seed, "user_ids": list(user_ids), "start": start, "days": days,
+               "output": output, "out_dir": out_dir, "database_url": database_url}
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks) or 1))
+
+    done = 0
+    started = time.perf_counter()
+    # spawn: each worker opens its own database connection
+    with mp.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(options,)) as pool:
+        for count in pool.imap_unordered(_run_batch, tasks):
+            done += count
+            elapsed = time.perf_counter() - started
+            print(f"{done}/{rows} transactions ({done / elapsed:,.0f} rows/s)")
+    return done
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a large synthetic transaction ledger.")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=100,
+                        help="number of users; with --output db the first N existing users")
+    parser.add_argument("--start", type=datetime.date.fromisoformat,
+                        default=datetime.date.today() - datetime.timedelta(days=365))
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--batch-size", type=int, default=GENERATOR_BATCH_SIZE)
+    parser.add_argument("--first-batch", type=int, default=0,
+                        help="number of the first batch; to add to an earlier run, the number it printed")
+    parser.add_argument("--output", choices=["db", "csv", "parquet"], default="db")
+    parser.add_argument("--out-dir", default="generated")
+    args = parser.parse_args()
+
+    database_url = None
+    if args.output == "db":
+        from Analytics.database import DATABASE_URL as database_url
+
+        user_ids = get_user_ids(database_url, args.users)
+        if not user_ids:
+            print("No users found in the database. Please create at least one user first.")
+            sys.exit(1)
+    else:
+        os.makedirs(args.out_dir, exist_ok=True)
+        user_ids = list(range(1, args.users + 1))
+
+    print(f"Generating {args.rows} transactions for {len(user_ids)} users from {args.start} over {args.days} days...")
+    started = time.perf_counter()
+    written = generate(args.rows, user_ids, args.start, args.days, seed=args.seed, workers=args.workers,
+                       output=args.output, out_dir=args.out_dir, database_url=database_url,
+                       batch_size=args.batch_size, first_batch=args.first_batch)
+    print(f"Wrote {written} transactions in {time.perf_counter() - started:.1f}s.")
+    # The same batch numbers regenerate the same orders, which the unique
+    # (UserId, orderID, item, date) index rejects.
+    print(f"To add more rows later, pass --first-batch {args.first_batch + math.ceil(args.rows / args.batch_size)}")
+    if args.output == "db":
+        print("Rebuild the rollups with: python -m Analytics.rollups --rebuild")
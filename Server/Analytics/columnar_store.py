@@ -0,0 +1,295 @@
+"""Optional in-process columnar copy of each active user's transactions.
+
+With ANALYTICS_COLUMNAR_STORE=1 the analytics endpoints compute from NumPy
+arrays instead of querying PostgreSQL. A user's rows are loaded on first
+access and kept as one array per column, about 26 bytes per transaction:
+
+    day      int32    days since 1970-01-01 (saleDate)
+    item     int32    code into the user's item names
+    order    int64    hash of orderID (only ever compared within a day)
+    quantity float32  quantityValue in the canonical unit
+    unit     int8     code into UNITS
+    price    float32  sellingPriceValue, the line total
+
+Rows are kept sorted by (day, order), so a date range is a slice found by
+binary search and per-day totals are segment sums. Only rows the sales
+rollups have folded in (and therefore normalized) are read; newer ones are
+appended once the rollup watermark passes them. Like the rollups, each load
+re-reads ROLLUP_OVERLAP ids below the watermark for rows that committed out
+of order, and skips the ids it already holds. Least recently used users
+are dropped when the arrays outgrow ANALYTICS_COLUMNAR_BUDGET_MB.
+"""
+import asyncio
+import datetime
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import text
+
+from Analytics.metrics import COLUMNAR_BYTES, COLUMNAR_USERS
+from Analytics.rollups import ROLLUP_OVERLAP, folded_watermark
+
+COLUMNAR_STORE_ENABLED = os.environ.get("ANALYTICS_COLUMNAR_STORE", "").lower() in ("1", "true", "yes")
+COLUMNAR_BUDGET_BYTES = int(float(os.environ.get("ANALYTICS_COLUMNAR_BUDGET_MB", 256)) * 2**20)
+# Seconds between checks for newly folded transactions.
+COLUMNAR_REFRESH_INTERVAL = float(os.environ.get("ANALYTICS_COLUMNAR_REFRESH_INTERVAL", 5))
+COLUMNAR_LOAD_CHUNK = 100000
+
+UNITS = [None, "kg", "L", "pcs"]
+UNIT_CODES = {unit: code for code, unit in enumerate(UNITS)}
+EPOCH = datetime.date(1970, 1, 1)
+
+LOAD_SQL = """
+    SELECT id, "saleDate" - DATE '1970-01-01', item, hashtextextended("orderID", 0),
+           "quantityValue", "quantityUnit", "sellingPriceValue"
+    FROM transactions
+    WHERE "UserId" = :user_id AND id > :after AND id <= :upto AND "saleDate" IS NOT NULL
+    ORDER BY id
+    LIMIT :limit
+"""
+
+COLUMNS = [("day", np.int32), ("item", np.int32), ("order", np.int64),
+           ("quantity", np.float32), ("unit", np.int8), ("price", np.float32)]
+
+
+def _day(value):
+    return None if value is None else (value - EPOCH).days
+
+
+def _order_starts(day, order_hash):
+    starts = np.ones(len(day), dtype=bool)
+    starts[1:] = (day[1:] != day[:-1]) | (order_hash[1:] != order_hash[:-1])
+    return starts
+
+
+class UserColumns:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.watermark = 0
+        # Ids loaded within ROLLUP_OVERLAP of the watermark, not to be added twice.
+        self.recent_ids = set()
+        self.items = []
+        self.item_codes = {}
+        self.size = 0
+        self.arrays = {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS}
+        # True on the first row of each (day, order), for counting orders.
+        self.order_start = np.zeros(0, dtype=bool)
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+
+    @property
+    def nbytes(self):
+        # Item names are counted at roughly their string size.
+        return (sum(array.nbytes for array in self.arrays.values()) + self.order_start.nbytes
+                + sum(len(name) + 50 for name in self.items))
+
+    def append(self, rows):
+        """Adds rows of (day, item name, order hash, quantity, unit, price)."""
+        if not rows:
+            return
+        days, names, orders, quantities, units, prices = zip(*rows)
+        item_codes = [self.item_codes.get(name) for name in names]
+        for k, code in enumerate(item_codes):
+            if code is None:
+                code = self.item_codes.setdefault(names[k], len(self.items))
+                if code == len(self.items):
+                    self.items.append(names[k])
+                item_codes[k] = code
+        new = {
+            "day": np.array(days, dtype=np.int32),
+            "item": np.array(item_codes, dtype=np.int32),
+            "order": np.array(orders, dtype=np.int64),
+            "quantity": np.array([q or 0 for q in quantities], dtype=np.float32),
+            "unit": np.array([UNIT_CODES.get(unit, 0) for unit in units], dtype=np.int8),
+            "price": np.array([p or 0 for p in prices], dtype=np.float32),
+        }
+        order = np.lexsort((new["order"], new["day"]))
+        new = {name: values[order] for name, values in new.items()}
+        day, order_hash = self.arrays["day"], self.arrays["order"]
+        if self.size and (new["day"][0], new["order"][0]) < (day[-1], order_hash[-1]):
+            # A ledger for earlier days: merge into place.
+            merged = {name: np.concatenate([self.arrays[name], new[name]]) for name, _ in COLUMNS}
+            order = np.lexsort((merged["order"], merged["day"]))
+            self.arrays = {name: values[order] for name, values in merged.items()}
+            self.order_start = _order_starts(self.arrays["day"], self.arrays["order"])
+        else:
+            # The usual case, newer days: the sorted rows go at the end.
+            starts = _order_starts(new["day"], new["order"])
+            if self.size:
+                starts[0] = (new["day"][0], new["order"][0]) != (day[-1], order_hash[-1])
+            self.arrays = {name: np.concatenate([self.arrays[name], new[name]]) for name, _ in COLUMNS}
+            self.order_start = np.concatenate([self.order_start, starts])
+        self.size = len(self.arrays["day"])
+
+    def _range(self, start, end):
+        day = self.arrays["day"]
+        low = 0 if start is None else int(np.searchsorted(day, _day(start), side="left"))
+        high = len(day) if end is None else int(np.searchsorted(day, _day(end), side="right"))
+        return slice(low, high)
+
+    def key_metrics(self, start=None, end=None):
+        rows = self._range(start, end)
+        revenue = float(self.arrays["price"][rows].sum(dtype=np.float64))
+        orders = int(self.order_start[rows].sum())
+        return {
+            "totalRevenue": round(revenue, 2),
+            "averageOrderValue": revenue / orders if orders else 0,
+            "totalOrders": orders,
+            "totalLineItems": rows.stop - rows.start,
+        }
+
+    def _segments(self, rows, starts):
+        """Revenue, orders and row count of the segments of the slice that
+        begin at the (increasing, non-empty) offsets `starts`."""
+        revenue = np.add.reduceat(self.arrays["price"][rows].astype(np.float64), starts)
+        orders = np.add.reduceat(self.order_start[rows].astype(np.int64), starts)
+        counts = np.diff(np.append(starts, rows.stop - rows.start))
+        return revenue, orders, counts
+
+    def monthly_sales(self, start=None, end=None):
+        rows = self._range(start, end)
+        day = self.arrays["day"][rows]
+        if not len(day):
+            return []
+        # Months are found by binary search for each month's first day.
+        months = np.arange(day[0].astype("datetime64[D]").astype("datetime64[M]"),
+                           day[-1].astype("datetime64[D]").astype("datetime64[M]") + 1)
+        starts = np.searchsorted(day, months.astype("datetime64[D]").astype(np.int64))
+        present = np.append(starts[1:], len(day)) > starts
+        revenue, _, _ = self._segments(rows, starts[present])
+        return [
+            {
+                "month": month.strftime("%b"),
+                "year": month.year,
+                "sales": round(float(sales), 2),
+                "profit": round(float(sales), 2) * 0.25,  # Dummy profit logic
+            }
+            for month, sales in zip(months[present].astype(datetime.date), revenue)
+        ]
+
+    def daily_sales(self, start=None, end=None):
+        rows = self._range(start, end)
+        day = self.arrays["day"][rows]
+        if not len(day):
+            return []
+        starts = np.concatenate([[0], np.flatnonzero(day[1:] != day[:-1]) + 1])
+        revenue, orders, counts = self._segments(rows, starts)
+        return [
+            {"date": (EPOCH + datetime.timedelta(days=int(d))).isoformat(), "sales": round(float(sales), 2),
+             "orders": int(order_count), "lineItems": int(count)}
+            for d, sales, order_count, count in zip(day[starts], revenue, orders, counts)
+        ]
+
+    def _by_item(self, rows):
+        item = self.arrays["item"][rows]
+        revenue = np.bincount(item, weights=self.arrays["price"][rows], minlength=len(self.items))
+        counts = np.bincount(item, minlength=len(self.items))
+        return item, revenue, counts
+
+    def item_sales(self, start=None, end=None, limit=20):
+        _, revenue, counts = self._by_item(self._range(start, end))
+        top = [i for i in np.argsort(-revenue, kind="stable") if counts[i]][:limit]
+        return [{"item": self.items[i], "sales": round(float(revenue[i]), 2), "lineItems": int(counts[i])} for i in top]
+
+    def item_breakdown(self, start=None, end=None, limit=20):
+        rows = self._range(start, end)
+        item, revenue, counts = self._by_item(rows)
+        unit = self.arrays["unit"][rows].astype(np.int64)
+        # Quantities only add up within a unit, so they are summed per (item, unit).
+        quantity = np.bincount(item * len(UNITS) + unit, weights=self.arrays["quantity"][rows],
+                               minlength=len(self.items) * len(UNITS)).reshape(len(self.items), len(UNITS))
+        total = revenue.sum()
+        top = [i for i in np.argsort(-revenue, kind="stable") if counts[i]][:limit]
+        return [
+            {
+                "item": self.items[i],
+                "sales": round(float(revenue[i]), 2),
+                "lineItems": int(counts[i]),
+                "revenueShare": round(float(revenue[i] / total), 4) if total else 0,
+                "quantities": [
+                    {"unit": UNITS[u], "quantity": round(float(quantity[i, u]), 3)}
+                    for u in range(len(UNITS)) if quantity[i, u]
+                ],
+            }
+            for i in top
+        ]
+
+
+class ColumnarStore:
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = budget_bytes or COLUMNAR_BUDGET_BYTES
+        self._users = OrderedDict()
+        # Users whose rows alone exceed the budget are always served from SQL.
+        self._oversized = set()
+        self._watermark = 0
+        self._watermark_at = 0.0
+
+    async def _rollup_watermark(self, db):
+        if time.monotonic() - self._watermark_at >= COLUMNAR_REFRESH_INTERVAL:
+            self._watermark = await folded_watermark(db)
+            self._watermark_at = time.monotonic()
+        return self._watermark
+
+    async def get(self, db, user_id):
+        """Returns the user's columns, loading or extending them first; None if
+        the user's rows alone exceed the memory budget."""
+        if user_id in self._oversized:
+            return None
+        columns = self._users.get(user_id)
+        if columns is None:
+            columns = self._users[user_id] = UserColumns(user_id)
+        self._users.move_to_end(user_id)
+
+        async with columns.lock:
+            upto = await self._rollup_watermark(db)
+            if upto > columns.watermark and time.monotonic() - columns.checked_at >= COLUMNAR_REFRESH_INTERVAL:
+                await self._load(db, columns, upto)
+                if columns.nbytes > self.budget_bytes:
+                    print(f"Transactions of user {user_id} exceed ANALYTICS_COLUMNAR_BUDGET_MB; using SQL.")
+                    self._oversized.add(user_id)
+                    self._users.pop(user_id, None)
+                self._evict()
+        if user_id not in self._users:
+            return None
+        return columns
+
+    async def _load(self, db, columns, upto):
+        rows = []
+        ids = []
+        after = max(0, columns.watermark - ROLLUP_OVERLAP)
+        while True:
+            chunk = (await db.execute(text(LOAD_SQL), {
+                "user_id": columns.user_id, "after": after, "upto": upto, "limit": COLUMNAR_LOAD_CHUNK,
+            })).all()
+            for row in chunk:
+                if row[0] not in columns.recent_ids:
+                    ids.append(row[0])
+                    rows.append(row[1:])
+            if len(chunk) < COLUMNAR_LOAD_CHUNK:
+                break
+            after = chunk[-1][0]
+        columns.append(rows)
+        columns.watermark = upto
+        columns.recent_ids = {i for i in (*columns.recent_ids, *ids) if i > upto - ROLLUP_OVERLAP}
+        columns.checked_at = time.monotonic()
+
+    def _evict(self):
+        total = sum(columns.nbytes for columns in self._users.values())
+        while total > self.budget_bytes and self._users:
+            _, columns = self._users.popitem(last=False)
+            total -= columns.nbytes
+        COLUMNAR_BYTES.set(total)
+        COLUMNAR_USERS.set(len(self._users))
+
+    def mark_stale(self, user_id):
+        # Makes the next request look for new rows straight away.
+        self._oversized.discard(user_id)
+        columns = self._users.get(user_id)
+        if columns is not None:
+            columns.checked_at = 0.0
+        self._watermark_at = 0.0
+
+
+columnar_store = ColumnarStore() if COLUMNAR_STORE_ENABLED else None
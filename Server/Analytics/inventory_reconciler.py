@@ -0,0 +1,313 @@
+"""Depletes inventory stock from the sales stored in transactions.
+
+Transactions are consumed by id from the "inventory" watermark in
+rollup_state, in chunks committed one at a time, like the rollups. Each sold
+line is matched to one of the user's inventories by product name (case,
+spacing and punctuation ignored, then the closest spelling) and its quantity
+is converted into the unit the stock is counted in before it is subtracted.
+Products that reach their lowStockThreshold get lowStockSince set, and lose
+it when a later sale finds them above it again (after a restock).
+
+Subtracting is not idempotent, so unlike the rollups no row is read twice.
+Instead the watermark never passes a missing id while it could still be
+committed: each gap in the ids read is remembered with the snapshot's xmax,
+and is passed only once every transaction running then has ended (and at
+least INVENTORY_SETTLE_SECONDS later), however long an OCR ingest or bulk
+COPY takes. Ids that never fill (rolled back, ON CONFLICT DO NOTHING,
+deleted) are passed the same way. The first run starts from the newest
+transaction: stock levels are taken as current then.
+
+    python -m Analytics.inventory_reconciler
+"""
+import asyncio
+import difflib
+import os
+import re
+import time
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+from Analytics.database import SessionLocal
+from Analytics.metrics import INVENTORY_RECONCILE_SECONDS, INVENTORY_ROWS
+from Analytics.normalize import UNITS, parse_quantity
+from Analytics.rollups import lock_watermark
+
+INVENTORY_NAME = "inventory"
+INVENTORY_CHUNK_SIZE = int(os.environ.get("INVENTORY_CHUNK_SIZE", 5000))
+INVENTORY_SETTLE_SECONDS = float(os.environ.get("INVENTORY_SETTLE_SECONDS", 30))
+# Requests reconcile at most this often, and at most this many chunks.
+INVENTORY_REFRESH_INTERVAL = float(os.environ.get("INVENTORY_REFRESH_INTERVAL", 5))
+INVENTORY_REQUEST_CHUNKS = int(os.environ.get("INVENTORY_REQUEST_CHUNKS", 2))
+# How alike (0-1) a ledger spelling must be to a product name to match it.
+INVENTORY_MATCH_CUTOFF = float(os.environ.get("INVENTORY_MATCH_CUTOFF", 0.85))
+INVENTORY_INDEX_USERS = int(os.environ.get("INVENTORY_INDEX_USERS", 1000))
+
+NAME_RE = re.compile(r"[^a-z0-9]+")
+PARENTHESES_RE = re.compile(r"\(([^)]*)\)")
+
+CHUNK_SQL = """
+    SELECT id, "UserId", item, quantity, "quantityValue", "quantityUnit"
+    FROM transactions
+    WHERE id > :after
+    ORDER BY id
+    LIMIT :limit
+"""
+SNAPSHOT_SQL = """
+    SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint,
+           pg_snapshot_xmax(pg_current_snapshot())::text::bigint
+"""
+# Changes whenever a product is added, removed, renamed or changes unit.
+SIGNATURES_SQL = """
+    SELECT "UserId", count(*), max(id), sum(hashtext("productName" || '|' || coalesce(unit, '')))
+    FROM inventories
+    WHERE "UserId" = ANY(CAST(:user_ids AS integer[]))
+    GROUP BY "UserId"
+"""
+PRODUCTS_SQL = """
+    SELECT "UserId", id, "productName", unit
+    FROM inventories
+    WHERE "UserId" = ANY(CAST(:user_ids AS integer[]))
+    ORDER BY id
+"""
+DEPLETE_SQL = """
+    UPDATE inventories i
+    SET "holdingQuantity" = i."holdingQuantity" - v.amount,
+        "lowStockSince" = CASE
+            WHEN i."lowStockThreshold" IS NOT NULL AND i."holdingQuantity" - v.amount <= i."lowStockThreshold"
+            THEN COALESCE(i."lowStockSince", now())
+        END,
+        "updatedAt" = now()
+    FROM unnest(CAST(:ids AS integer[]), CAST(:amounts AS numeric[])) AS v(id, amount)
+    WHERE i.id = v.id
+"""
+
+
+def name_key(name):
+    return " ".join(NAME_RE.sub(" ", (name or "").lower()).split())
+
+
+def stock_unit(unit):
+    """(canonical unit, factor) for an inventory unit such as "gm" or "dozen";
+    (None, 1) for a product without one."""
+    return UNITS.get((unit or "").strip().lower(), (None, 1))
+
+
+def stock_amount(value, unit, stock):
+    """A sold quantity (value in the canonical unit, see normalize.py) in the
+    unit the stock is counted in; None when the units do not convert. A bare
+    number is taken as written. Stock without a unit is counted in pieces, so
+    weights and volumes sold of it do not convert until it is given one."""
+    canonical, factor = stock
+    if unit is None:
+        return value
+    if canonical is None:
+        return value if unit == "pcs" else None
+    if unit != canonical:
+        return None
+    return value / factor
+
+
+class InventoryIndex:
+    """One user's products by normalized name, and the products each ledger
+    spelling has resolved to so far."""
+
+    def __init__(self, signature, products):
+        self.signature = signature
+        self.units = {}
+        self.keys = {}
+        self.resolved = {}
+        for product_id, name, unit in products:
+            self.units[product_id] = stock_unit(unit)
+            key = name_key(name)
+            self.keys.setdefault(key, product_id)
+            # "Suji (Semolina)" is also found as "suji" and "semolina".
+            for alias in (PARENTHESES_RE.sub(" ", name), *PARENTHESES_RE.findall(name)):
+                if name_key(alias):
+                    self.keys.setdefault(name_key(alias), product_id)
+
+    def match(self, item):
+        if item not in self.resolved:
+            key = name_key(item)
+            product_id = self.keys.get(key)
+            if product_id is None and key:
+                close = difflib.get_close_matches(key, list(self.keys), n=1, cutoff=INVENTORY_MATCH_CUTOFF)
+                product_id = self.keys[close[0]] if close else None
+            self.resolved[item] = product_id
+        return self.resolved[item]
+
+
+_indexes = OrderedDict()
+
+
+def load_indexes(db, user_ids):
+    """The users' name indexes, reloading those whose products changed."""
+    user_ids = sorted(user_ids)
+    signatures = {
+        user_id: tuple(signature)
+        for user_id, *signature in db.execute(text(SIGNATURES_SQL), {"user_ids": user_ids}).all()
+    }
+    stale = [user_id for user_id in user_ids
+             if user_id not in _indexes or _indexes[user_id].signature != signatures.get(user_id)]
+    if stale:
+        products = {user_id: [] for user_id in stale}
+        for user_id, product_id, name, unit in db.execute(text(PRODUCTS_SQL), {"user_ids": stale}).all():
+            products[user_id].append((product_id, name, unit))
+        for user_id in stale:
+            _indexes[user_id] = InventoryIndex(signatures.get(user_id), products[user_id])
+    for user_id in user_ids:
+        _indexes.move_to_end(user_id)
+    while len(_indexes) > INVENTORY_INDEX_USERS:
+        _indexes.popitem(last=False)
+    return {user_id: _indexes[user_id] for user_id in user_ids}
+
+
+# (first id, last id) of each gap in the ids read -> (snapshot xmax, time)
+# when it was first seen.
+_gaps = {}
+
+
+def settled_rows(db, rows, after):
+    """The leading rows not preceded by a gap some running transaction may
+    still fill."""
+    xmin, xmax = db.execute(text(SNAPSHOT_SQL)).one()
+    now = time.monotonic()
+    gaps = []
+    expected = after + 1
+    for position, row in enumerate(rows):
+        if row.id > expected:
+            gaps.append((position, (expected, row.id - 1)))
+        expected = row.id + 1
+    for _, gap in gaps:
+        _gaps.setdefault(gap, (xmax, now))
+    settled = len(rows)
+    for position, gap in gaps:
+        seen_xmax, seen_at = _gaps[gap]
+        if xmin < seen_xmax or now - seen_at < INVENTORY_SETTLE_SECONDS:
+            settled = position
+            break
+    last_id = rows[settled - 1].id if settled else after
+    for gap in [gap for gap in _gaps if gap[1] < last_id]:
+        del _gaps[gap]
+    return rows[:settled]
+
+
+def deplete_chunk(db, after, chunk_size):
+    """Subtracts the sales in the next settled chunk of transactions with an
+    id above `after`. Returns (rows read, highest id read)."""
+    rows = db.execute(text(CHUNK_SQL), {"after": after, "limit": chunk_size}).all()
+    rows = settled_rows(db, rows, after)
+    if not rows:
+        return 0, after
+
+    indexes = load_indexes(db, {row.UserId for row in rows})
+    amounts = {}
+    counts = {"matched": 0, "unmatched": 0, "unconvertible": 0}
+    for row in rows:
+        index = indexes[row.UserId]
+        product_id = index.match(row.item)
+        if product_id is None:
+            counts["unmatched"] += 1
+            continue
+        if row.quantityValue is not None:
+            value, unit = float(row.quantityValue), row.quantityUnit
+        else:
+            # Not normalized yet (the rollups have not reached it).
+            value, unit = parse_quantity(row.quantity)
+        amount = None if value is None else stock_amount(value, unit, index.units[product_id])
+        if amount is None:
+            counts["unconvertible"] += 1
+            continue
+        amounts[product_id] = amounts.get(product_id, 0.0) + amount
+        counts["matched"] += 1
+
+    if amounts:
+        ids = sorted(amounts)
+        db.execute(text(DEPLETE_SQL), {"ids": ids, "amounts": [round(amounts[i], 3) for i in ids]})
+    for result, count in counts.items():
+        INVENTORY_ROWS.labels(result).inc(count)
+    return len(rows), rows[-1].id
+
+
+def reconcile_inventory(db, chunk_size=None, max_chunks=None):
+    """Depletes stock by the transactions stored since the last run.
+
+    Returns the number of transaction rows read, or None when another run
+    holds the watermark.
+    """
+    chunk_size = chunk_size or INVENTORY_CHUNK_SIZE
+    start = time.perf_counter()
+    db.execute(
+        text("INSERT INTO rollup_state (name, \"lastTransactionId\", \"updatedAt\") "
+             "SELECT :name, COALESCE(max(id), 0), now() FROM transactions ON CONFLICT (name) DO NOTHING"),
+        {"name": INVENTORY_NAME},
+    )
+    db.commit()
+
+    total = 0
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        after = lock_watermark(db, INVENTORY_NAME)
+        if after is None:
+            db.rollback()
+            return None if not chunks else total
+        count, last_id = deplete_chunk(db, after, chunk_size)
+        if count == 0:
+            db.rollback()
+            break
+        db.execute(
+            text("UPDATE rollup_state SET \"lastTransactionId\" = :last_id, \"updatedAt\" = now() WHERE name = :name"),
+            {"last_id": last_id, "name": INVENTORY_NAME},
+        )
+        db.commit()
+        total += count
+        chunks += 1
+        if count < chunk_size:
+            break
+
+    INVENTORY_RECONCILE_SECONDS.observe(time.perf_counter() - start)
+    return total
+
+
+_reconcile_lock = asyncio.Lock()
+_last_reconcile = 0.0
+
+
+def _reconcile_in_thread(max_chunks=None):
+    db = SessionLocal()
+    try:
+        return reconcile_inventory(db, max_chunks=max_chunks)
+    finally:
+        db.close()
+
+
+async def reconcile_if_stale():
+    # Called on inventory reads, the same way refresh_if_stale keeps the rollups current.
+    global _last_reconcile
+    if time.monotonic() - _last_reconcile < INVENTORY_REFRESH_INTERVAL or _reconcile_lock.locked():
+        return
+    async with _reconcile_lock:
+        _last_reconcile = time.monotonic()
+        try:
+            await asyncio.to_thread(_reconcile_in_thread, INVENTORY_REQUEST_CHUNKS)
+        except Exception as e:
+            print(f"Error reconciling inventory: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Deplete inventory stock by the transactions stored since the last run.")
+    parser.add_argument("--chunk-size", type=int, default=INVENTORY_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        rows = reconcile_inventory(db, chunk_size=args.chunk_size)
+        if rows is None:
+            print("Another inventory reconciliation is running; try again later.")
+        else:
+            print(f"Reconciled {rows} transactions against inventory in {time.perf_counter() - start:.1f}s.")
+    finally:
+        db.close()
@@ -1,17 +1,99 @@
 # Server/main.py
-from fastapi import FastAPI
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from Analytics.database import async_engine
+from Analytics.metrics import DB_CONNECTIONS_IN_USE, REQUESTS_IN_FLIGHT, REQUEST_SECONDS, render_metrics
+from Analytics.profiler import SamplingProfiler
 from Analytics.routes.analytics_routes import router as analytics_router
+from Analytics.routes.internal_routes import router as internal_router
+from Analytics.routes.inventory_routes import router as inventory_router
 # Import other routers as needed
 # from Auth-Service.routes.auth_routes import router as auth_router
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close pooled connections on shutdown
+    await async_engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
+
+# The dashboard sends the Auth-Service 'jwt' cookie, so credentials are allowed
+# for the client origin only.
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[os.environ.get("CORS_ORIGIN", "http://localhost:5173")],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
-# Include routers
-app.include_router(analytics_router, prefix="/analytics")
+# Include routers (the analytics router carries its own /analytics prefix)
+app.include_router(analytics_router)
+app.include_router(internal_router)
+app.include_router(inventory_router)
 # app.include_router(auth_router, prefix="/auth")
 
+# The /debug/profile endpoints are only served when this is set.
+PROFILER_ENABLED = os.environ.get("ANALYTICS_PROFILER_ENABLED", "").lower() in ("1", "true", "yes")
+profiler = SamplingProfiler()
+
+def connections_in_use():
+    # Only queue pools (the PostgreSQL default) track checked out connections.
+    checkedout = getattr(async_engine.pool, "checkedout", None)
+    return checkedout() if checkedout else 0
+
+DB_CONNECTIONS_IN_USE.set_function(connections_in_use)
+
+@app.middleware("http")
+async def record_request(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        # Label by route template rather than raw path to keep the series bounded.
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        REQUEST_SECONDS.labels(request.method, endpoint, status).observe(time.perf_counter() - start)
+
 @app.get("/")
 def root():
     return {"message": "Welcome to LedgerSense API"}
 
-# You can run this via: uvicorn main:app --reload
+@app.get("/metrics")
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+def require_profiler():
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set ANALYTICS_PROFILER_ENABLED=1)")
+
+@app.get("/debug/profile")
+def profile_status():
+    require_profiler()
+    return {"running": profiler.running(), "samples": profiler.samples, "top": profiler.top()}
+
+@app.post("/debug/profile/start")
+def start_profile():
+    require_profiler()
+    profiler.start()
+    return {"running": True}
+
+@app.post("/debug/profile/stop")
+def stop_profile():
+    require_profiler()
+    profiler.stop()
+    path = profiler.write(f"analytics-{os.getpid()}")
+    return {"running": False, "samples": profiler.samples, "profile": path, "top": profiler.top()}
+
+# You can run this from Server/ via: uvicorn Analytics.main:app --reload
@@ -0,0 +1,43 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+QUERY_SECONDS = Histogram(
+    "analytics_query_seconds", "Database time per analytics endpoint",
+    ["endpoint"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "analytics_http_request_seconds", "HTTP request latency",
+    ["method", "endpoint", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge("analytics_http_requests_in_flight", "HTTP requests currently being served")
+DB_CONNECTIONS_IN_USE = Gauge("analytics_db_connections_in_use", "Pooled database connections checked out")
+ROLLUP_REFRESH_SECONDS = Histogram(
+    "analytics_rollup_refresh_seconds", "Time spent folding new transactions into the sales rollups",
+    buckets=LATENCY_BUCKETS,
+)
+ROLLUP_ROWS = Counter("analytics_rollup_rows", "Transactions folded into the sales rollups")
+COLUMNAR_QUERY_SECONDS = Histogram(
+    "analytics_columnar_query_seconds", "Time per analytics endpoint computed from the columnar store",
+    ["endpoint"], buckets=(0.0001, 0.00025, 0.0005) + LATENCY_BUCKETS,
+)
+COLUMNAR_BYTES = Gauge("analytics_columnar_bytes", "Memory held by the columnar transaction store")
+COLUMNAR_USERS = Gauge("analytics_columnar_users", "Users held in the columnar transaction store")
+BASKET_UPDATE_SECONDS = Histogram(
+    "analytics_basket_update_seconds", "Time spent building or extending a user's basket index",
+    ["kind"], buckets=LATENCY_BUCKETS,
+)
+INVENTORY_RECONCILE_SECONDS = Histogram(
+    "analytics_inventory_reconcile_seconds", "Time spent depleting inventory by new transactions",
+    buckets=LATENCY_BUCKETS,
+)
+INVENTORY_ROWS = Counter(
+    "analytics_inventory_rows", "Transactions reconciled against inventory, by whether they matched a product",
+    ["result"],
+)
+CACHE_REQUESTS = Counter("analytics_cache_requests", "Analytics response cache lookups", ["result"])
+CACHE_ENTRIES = Gauge("analytics_cache_entries", "Responses held in the in-process analytics cache")
+
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
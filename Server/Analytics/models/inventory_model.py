@@ -0,0 +1,22 @@
+from sqlalchemy import Column, DateTime, Integer, Numeric, String
+
+from Analytics.database import Base
+
+
+# Mirrors the inventories table owned by the Auth-Service migrations; stock
+# is depleted by Analytics/inventory_reconciler.py.
+class Inventory(Base):
+    __tablename__ = "inventories"
+
+    id = Column(Integer, primary_key=True)
+    UserId = Column(Integer, nullable=False)
+    productName = Column(String, nullable=False)
+    unitPrice = Column(Numeric(10, 2), nullable=False)
+    holdingQuantity = Column(Numeric(12, 3), nullable=False)
+    # Unit holdingQuantity is counted in (kg, gm, L, ml, pcs, dozen, ...);
+    # empty means as written in the ledger.
+    unit = Column(String(8))
+    lowStockThreshold = Column(Numeric(12, 3))
+    lowStockSince = Column(DateTime(timezone=True))
+    createdAt = Column(DateTime, nullable=False)
+    updatedAt = Column(DateTime, nullable=False)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Date, Integer, Numeric, String
+
+from Analytics.database import Base
+
+
+# Rollup tables created by the Auth-Service migrations and filled by
+# Analytics/rollups.py.
+class DailySales(Base):
+    __tablename__ = "daily_sales"
+
+    UserId = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    revenue = Column(Numeric(14, 2), nullable=False)
+    orders = Column(Integer, nullable=False)
+    lineItems = Column(Integer, nullable=False)
+
+
+class DailyItemSales(Base):
+    __tablename__ = "daily_item_sales"
+
+    UserId = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    item = Column(String, primary_key=True)
+    revenue = Column(Numeric(14, 2), nullable=False)
+    lineItems = Column(Integer, nullable=False)
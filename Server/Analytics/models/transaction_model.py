@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Date, DateTime, Integer, Numeric, String
+
+from Analytics.database import Base
+
+
+# Mirrors the transactions table owned by the Auth-Service migrations; the
+# schema itself is only changed there.
+class Transaction(Base):
+    __tablename__ = "transactions"
+
+    id = Column(Integer, primary_key=True)
+    UserId = Column(Integer, nullable=False)
+    date = Column(String, nullable=False)
+    orderID = Column(String, nullable=False)
+    item = Column(String, nullable=False)
+    quantity = Column(String, nullable=False)
+    sellingPrice = Column(String, nullable=False)
+    # Parsed copies of the text columns, filled by Analytics/normalize.py.
+    quantityValue = Column(Numeric(12, 3))
+    quantityUnit = Column(String(8))
+    sellingPriceValue = Column(Numeric(12, 2))
+    saleDate = Column(Date)
+    createdAt = Column(DateTime, nullable=False)
+    updatedAt = Column(DateTime, nullable=False)
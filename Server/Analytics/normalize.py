@@ -0,0 +1,164 @@
+"""Fills the numeric columns of transactions (quantityValue, quantityUnit,
+sellingPriceValue, saleDate) from the text the ledger was recorded with.
+
+The backfill walks the table by id in short batches, each its own
+transaction, and records its position in rollup_state so it can be stopped
+and resumed; inserts carry on normally while it runs.
+
+    python -m Analytics.normalize [--batch-size 5000] [--pause 0.05] [--restart]
+"""
+import datetime
+import os
+import re
+import time
+
+from sqlalchemy import text
+
+NORMALIZE_NAME = "normalize"
+NORMALIZE_BATCH_SIZE = int(os.environ.get("NORMALIZE_BATCH_SIZE", 5000))
+
+QUANTITY_RE = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*([A-Za-z]*)")
+PRICE_RE = re.compile(r"\d+(?:\.\d+)?")
+# Units as shops write them, mapped to a canonical unit and the factor to
+# convert into it, so quantities of one item add up whatever unit was used.
+UNITS = {
+    "kg": ("kg", 1), "kgs": ("kg", 1), "kilo": ("kg", 1), "kilos": ("kg", 1), "kilogram": ("kg", 1),
+    "g": ("kg", 0.001), "gm": ("kg", 0.001), "gms": ("kg", 0.001), "gr": ("kg", 0.001), "gram": ("kg", 0.001),
+    "grams": ("kg", 0.001),
+    "l": ("L", 1), "lt": ("L", 1), "ltr": ("L", 1), "ltrs": ("L", 1), "litre": ("L", 1), "litres": ("L", 1),
+    "liter": ("L", 1), "liters": ("L", 1),
+    "ml": ("L", 0.001),
+    "pc": ("pcs", 1), "pcs": ("pcs", 1), "piece": ("pcs", 1), "pieces": ("pcs", 1), "nos": ("pcs", 1),
+    "dozen": ("pcs", 12), "dz": ("pcs", 12),
+}
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y/%m/%d")
+
+UPDATE_SQL = """
+    UPDATE transactions t
+    SET "quantityValue" = v.quantity_value,
+        "quantityUnit" = v.quantity_unit,
+        "sellingPriceValue" = v.price_value,
+        "saleDate" = v.sale_date
+    FROM unnest(
+        CAST(:ids AS integer[]),
+        CAST(:quantity_values AS numeric[]),
+        CAST(:quantity_units AS varchar[]),
+        CAST(:price_values AS numeric[]),
+        CAST(:sale_dates AS date[])
+    ) AS v(id, quantity_value, quantity_unit, price_value, sale_date)
+    WHERE t.id = v.id
+"""
+
+
+def parse_quantity(value):
+    """Parses e.g. "0.5kg" to (0.5, "kg"), "250gm" to (0.25, "kg") and "2" to (2.0, None)."""
+    match = QUANTITY_RE.match(value or "")
+    if not match:
+        return None, None
+    number = float(match.group(1).replace(",", "."))
+    unit = UNITS.get(match.group(2).lower())
+    if unit is None:
+        return number, None
+    canonical, factor = unit
+    return round(number * factor, 3), canonical
+
+
+def parse_price(value):
+    match = PRICE_RE.search((value or "").replace(",", ""))
+    return float(match.group()) if match else None
+
+
+def parse_date(value):
+    value = (value or "").strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_rows(db, rows):
+    """Writes the numeric columns for rows of (id, quantity, sellingPrice, date)."""
+    if not rows:
+        return
+    ids, quantity_values, quantity_units, price_values, sale_dates = [], [], [], [], []
+    for row_id, quantity, selling_price, date in rows:
+        quantity_value, quantity_unit = parse_quantity(quantity)
+        ids.append(row_id)
+        quantity_values.append(quantity_value)
+        quantity_units.append(quantity_unit)
+        price_values.append(parse_price(selling_price))
+        sale_dates.append(parse_date(date))
+    db.execute(text(UPDATE_SQL), {
+        "ids": ids,
+        "quantity_values": quantity_values,
+        "quantity_units": quantity_units,
+        "price_values": price_values,
+        "sale_dates": sale_dates,
+    })
+
+
+def backfill(db, batch_size=None, pause=0.0, restart=False):
+    """Normalizes every transaction above the saved position, one committed
+    batch at a time. Returns the number of rows written."""
+    batch_size = batch_size or NORMALIZE_BATCH_SIZE
+    if restart:
+        db.execute(text("DELETE FROM rollup_state WHERE name = :name"), {"name": NORMALIZE_NAME})
+    db.execute(
+        text("INSERT INTO rollup_state (name, \"lastTransactionId\", \"updatedAt\") VALUES (:name, 0, now()) "
+             "ON CONFLICT (name) DO NOTHING"),
+        {"name": NORMALIZE_NAME},
+    )
+    db.commit()
+
+    total = 0
+    while True:
+        after = db.execute(
+            text("SELECT \"lastTransactionId\" FROM rollup_state WHERE name = :name"),
+            {"name": NORMALIZE_NAME},
+        ).scalar()
+        # Keyset pagination on the primary key: every batch is an index range
+        # scan, however far into the table the backfill is.
+        rows = db.execute(
+            text("SELECT id, quantity, \"sellingPrice\", date FROM transactions "
+                 "WHERE id > :after ORDER BY id LIMIT :limit"),
+            {"after": after, "limit": batch_size},
+        ).all()
+        if not rows:
+            db.rollback()
+            break
+        normalize_rows(db, rows)
+        db.execute(
+            text("UPDATE rollup_state SET \"lastTransactionId\" = :last_id, \"updatedAt\" = now() WHERE name = :name"),
+            {"last_id": rows[-1][0], "name": NORMALIZE_NAME},
+        )
+        db.commit()
+        total += len(rows)
+        print(f"Normalized {total} transactions (up to id {rows[-1][0]})")
+        if len(rows) < batch_size:
+            break
+        if pause:
+            # Leaves room for other writers on a busy database.
+            time.sleep(pause)
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from Analytics.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Backfill the numeric transaction columns.")
+    parser.add_argument("--batch-size", type=int, default=NORMALIZE_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--restart", action="store_true", help="start again from the first transaction")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        rows = backfill(db, batch_size=args.batch_size, pause=args.pause, restart=args.restart)
+        print(f"Normalized {rows} transactions in {time.perf_counter() - start:.1f}s.")
+    finally:
+        db.close()
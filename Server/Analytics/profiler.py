@@ -0,0 +1,91 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_INTERVAL = float(os.environ.get("ANALYTICS_PROFILE_INTERVAL", 0.005))
+PROFILE_DIR = os.environ.get("ANALYTICS_PROFILE_DIR", "profiles")
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of every other thread in the process at a
+    fixed interval while running; stopped, it costs nothing.
+
+    Stacks are kept in the collapsed "frame;frame;frame count" format that
+    flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or PROFILE_INTERVAL
+        self.samples = 0
+        self.started_at = None
+        self._stacks = Counter()
+        # Held by the sampler while it adds stacks, so readers can copy them.
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self.running():
+            return False
+        self._stacks = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if not self.running():
+            return False
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return True
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                with self._lock:
+                    self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def _snapshot(self):
+        # The sampler keeps adding stacks while a profile is read mid-run.
+        with self._lock:
+            return self._stacks.copy()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self._snapshot().most_common())
+
+    def top(self, limit=20):
+        # "self" counts samples where the function was executing, "total"
+        # samples where it was anywhere on the stack.
+        own = Counter()
+        total = Counter()
+        for stack, count in self._snapshot().items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return [{"function": name, "self": count, "total": total[name]} for name, count in own.most_common(limit)]
+
+    def write(self, name):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{name}.folded")
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+        return path
@@ -0,0 +1,161 @@
+"""Per-user cache of analytics responses.
+
+Entries are keyed by user, endpoint and query parameters plus the user's data
+version. Storing new transactions bumps the version (POST
+/internal/transactions-stored), so the next dashboard load recomputes while
+other users' entries stay warm; TTLs bound staleness if a notification is
+lost.
+
+The default backend lives in this process. With several API processes, set
+ANALYTICS_CACHE_REDIS_URL to share one Redis-compatible server (Redis,
+Valkey, KeyDB...) so a version bump reaches all of them.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from Analytics.metrics import CACHE_ENTRIES, CACHE_REQUESTS
+
+# Seconds a response stays cached; 0 turns the cache off.
+CACHE_TTL = float(os.environ.get("ANALYTICS_CACHE_TTL", 300))
+CACHE_MAX_ENTRIES = int(os.environ.get("ANALYTICS_CACHE_MAX_ENTRIES", 10000))
+CACHE_REDIS_URL = os.environ.get("ANALYTICS_CACHE_REDIS_URL")
+
+
+def _entry_key(user_id, version, endpoint, params):
+    return f"{user_id}:{version}:{endpoint}:{json.dumps(params, sort_keys=True, default=str)}"
+
+
+class MemoryResponseCache:
+    """LRU bounded by entry count, with a TTL per entry."""
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = ttl or CACHE_TTL
+        self.max_entries = max_entries or CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    async def get(self, user_id, endpoint, params):
+        with self._lock:
+            key = _entry_key(user_id, self._versions.get(user_id, 0), endpoint, params)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, user_id, endpoint, params, value, version=None):
+        with self._lock:
+            current = self._versions.get(user_id, 0)
+            if version is not None and version != current:
+                # Computed before a bump; storing it would hide the new data.
+                return
+            key = _entry_key(user_id, current, endpoint, params)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def version(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    async def bump(self, user_id):
+        # Older entries of this user can no longer be reached and age out of
+        # the LRU; drop them now so they do not push out other users' entries.
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            prefix = f"{user_id}:"
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def entries(self):
+        return len(self._entries)
+
+
+class RedisResponseCache:
+    """Same interface on a Redis-compatible server; needs the redis package."""
+
+    def __init__(self, url, ttl=None):
+        import redis.asyncio as redis
+
+        self.ttl = ttl or CACHE_TTL
+        self._redis = redis.from_url(url)
+
+    async def get(self, user_id, endpoint, params):
+        version = await self.version(user_id)
+        value = await self._redis.get(f"analytics:{_entry_key(user_id, version, endpoint, params)}")
+        return None if value is None else json.loads(value)
+
+    async def set(self, user_id, endpoint, params, value, version=None):
+        current = await self.version(user_id)
+        if version is not None and version != current:
+            return
+        key = f"analytics:{_entry_key(user_id, current, endpoint, params)}"
+        await self._redis.set(key, json.dumps(value), ex=int(self.ttl))
+
+    async def version(self, user_id):
+        value = await self._redis.get(f"analytics:version:{user_id}")
+        return int(value) if value is not None else 0
+
+    async def bump(self, user_id):
+        # Entries under the old version expire on their own TTL.
+        await self._redis.incr(f"analytics:version:{user_id}")
+
+    def entries(self):
+        return 0
+
+
+def create_response_cache():
+    if CACHE_REDIS_URL:
+        try:
+            return RedisResponseCache(CACHE_REDIS_URL)
+        except ImportError:
+            print("ANALYTICS_CACHE_REDIS_URL is set but the redis package is not installed; "
+                  "using the in-process cache.")
+    return MemoryResponseCache()
+
+
+response_cache = create_response_cache()
+CACHE_ENTRIES.set_function(response_cache.entries)
+
+
+async def cached(user_id, endpoint, params, compute):
+    """Returns the cached response for this user and request, or awaits
+    compute() and stores its result."""
+    if CACHE_TTL <= 0:
+        return await compute()
+    try:
+        value = await response_cache.get(user_id, endpoint, params)
+    except Exception as e:
+        print(f"Error reading analytics cache: {e}")
+        value = None
+    if value is not None:
+        CACHE_REQUESTS.labels("hit").inc()
+        return value
+
+    CACHE_REQUESTS.labels("miss").inc()
+    # The version is read before computing, so a bump that lands while the
+    # query runs keeps this (possibly stale) result out of the cache.
+    try:
+        version = await response_cache.version(user_id)
+    except Exception as e:
+        print(f"Error reading analytics cache: {e}")
+        return await compute()
+    value = await compute()
+    try:
+        await response_cache.set(user_id, endpoint, params, value, version=version)
+    except Exception as e:
+        print(f"Error writing analytics cache: {e}")
+    return value
+
+
+async def invalidate_user(user_id):
+    await response_cache.bump(user_id)
@@ -0,0 +1,240 @@
+"""Incremental maintenance of the daily_sales and daily_item_sales rollups.
+
+Transactions are folded in by id: every refresh reads the rows above the
+stored watermark in chunks, fills their numeric columns (see normalize.py),
+recomputes each (user, day) they touch from the transactions table and moves
+the watermark forward, committing per chunk so a backfill can be stopped and
+resumed at any point.
+
+    python -m Analytics.rollups              # fold in everything new
+    python -m Analytics.rollups --rebuild    # recompute all rollups from scratch
+"""
+import asyncio
+import os
+import time
+
+from sqlalchemy import text
+
+from Analytics.database import SessionLocal
+from Analytics.metrics import ROLLUP_REFRESH_SECONDS, ROLLUP_ROWS
+from Analytics.normalize import normalize_rows, parse_date
+
+ROLLUP_NAME = "sales"
+ROLLUP_CHUNK_SIZE = int(os.environ.get("ROLLUP_CHUNK_SIZE", 5000))
+# Ids of concurrent inserts can commit out of order, so each refresh re-reads
+# this many rows below the watermark; recomputing a day is idempotent.
+ROLLUP_OVERLAP = int(os.environ.get("ROLLUP_OVERLAP", 500))
+# Requests refresh the rollups at most this often, and fold in at most this
+# many chunks; larger backlogs are left to the backfill command.
+ROLLUP_REFRESH_INTERVAL = float(os.environ.get("ROLLUP_REFRESH_INTERVAL", 5))
+ROLLUP_REQUEST_CHUNKS = int(os.environ.get("ROLLUP_REQUEST_CHUNKS", 2))
+
+# Days are recomputed from the numeric columns through the (UserId, saleDate)
+# index; sellingPriceValue is the line total.
+RECOMPUTE_SQL = [
+    """
+    DELETE FROM daily_sales d
+    USING unnest(CAST(:user_ids AS integer[]), CAST(:days AS date[])) AS k("UserId", day)
+    WHERE d."UserId" = k."UserId" AND d.day = k.day
+    """,
+    """
+    INSERT INTO daily_sales ("UserId", day, revenue, orders, "lineItems")
+    SELECT t."UserId", t."saleDate", COALESCE(SUM(t."sellingPriceValue"), 0), COUNT(DISTINCT t."orderID"), COUNT(*)
+    FROM transactions t
+    JOIN unnest(CAST(:user_ids AS integer[]), CAST(:days AS date[])) AS k("UserId", day)
+      ON t."UserId" = k."UserId" AND t."saleDate" = k.day
+    GROUP BY t."UserId", t."saleDate"
+    """,
+    """
+    DELETE FROM daily_item_sales d
+    USING unnest(CAST(:user_ids AS integer[]), CAST(:days AS date[])) AS k("UserId", day)
+    WHERE d."UserId" = k."UserId" AND d.day = k.day
+    """,
+    """
+    INSERT INTO daily_item_sales ("UserId", day, item, revenue, "lineItems")
+    SELECT t."UserId", t."saleDate", t.item, COALESCE(SUM(t."sellingPriceValue"), 0), COUNT(*)
+    FROM transactions t
+    JOIN unnest(CAST(:user_ids AS integer[]), CAST(:days AS date[])) AS k("UserId", day)
+      ON t."UserId" = k."UserId" AND t."saleDate" = k.day
+    GROUP BY t."UserId", t."saleDate", t.item
+    """,
+]
+
+_refresh_lock = asyncio.Lock()
+_last_refresh = 0.0
+# (watermark, rows in the overlap window) when a refresh found no new ids; a
+# late row committing below the watermark changes the count.
+_overlap_seen = None
+
+
+def lock_watermark(db, name=ROLLUP_NAME):
+    # The state row doubles as a lock: a refresh already running elsewhere
+    # holds it, and this one then has nothing to do.
+    db.execute(
+        text("INSERT INTO rollup_state (name, \"lastTransactionId\", \"updatedAt\") VALUES (:name, 0, now()) "
+             "ON CONFLICT (name) DO NOTHING"),
+        {"name": name},
+    )
+    db.commit()
+    row = db.execute(
+        text("SELECT \"lastTransactionId\" FROM rollup_state WHERE name = :name FOR UPDATE SKIP LOCKED"),
+        {"name": name},
+    ).first()
+    return None if row is None else row[0]
+
+
+def fold_chunk(db, after, chunk_size):
+    """Recomputes the days touched by the next chunk of transactions with an
+    id above `after`. Returns (rows read, highest id read)."""
+    rows = db.execute(
+        text("SELECT id, \"UserId\", quantity, \"sellingPrice\", date FROM transactions "
+             "WHERE id > :after ORDER BY id LIMIT :limit"),
+        {"after": after, "limit": chunk_size},
+    ).all()
+    if not rows:
+        return 0, after
+    normalize_rows(db, [(row_id, quantity, price, date) for row_id, _, quantity, price, date in rows])
+    # Rows whose date cannot be read are left out of the rollups.
+    sale_days = ((user_id, parse_date(date)) for _, user_id, _, _, date in rows)
+    recompute_days(db, {(user_id, day) for user_id, day in sale_days if day is not None})
+    return len(rows), rows[-1][0]
+
+
+def recompute_days(db, keys):
+    """Recomputes the rollup rows of the given (user id, day) pairs from transactions."""
+    if not keys:
+        return
+    user_ids, days = zip(*sorted(keys))
+    params = {"user_ids": list(user_ids), "days": list(days)}
+    for statement in RECOMPUTE_SQL:
+        db.execute(text(statement), params)
+
+
+def refresh_rollups(db, chunk_size=None, max_chunks=None, overlap=None):
+    """Folds transactions added since the last refresh into the rollups.
+
+    Returns the number of transaction rows read, or None when another refresh
+    holds the watermark.
+    """
+    global _overlap_seen
+    chunk_size = chunk_size or ROLLUP_CHUNK_SIZE
+    overlap = ROLLUP_OVERLAP if overlap is None else overlap
+    start = time.perf_counter()
+
+    watermark = lock_watermark(db)
+    if watermark is None:
+        db.rollback()
+        return None
+    after = max(0, watermark - overlap)
+    newest = db.execute(text("SELECT max(id) FROM transactions")).scalar() or 0
+    idle = None
+    if newest <= watermark:
+        # Nothing new, but the overlap window is still re-read when a row
+        # committed late into it since the last look.
+        idle = (watermark, db.execute(
+            text("SELECT count(*) FROM transactions WHERE id > :after"), {"after": after}
+        ).scalar())
+        if idle == _overlap_seen:
+            db.rollback()
+            return 0
+
+    total = 0
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        if chunks:
+            watermark = lock_watermark(db)
+            if watermark is None:
+                db.rollback()
+                break
+            after = max(after, watermark)
+        count, last_id = fold_chunk(db, after, chunk_size)
+        if count == 0:
+            db.rollback()
+            break
+        db.execute(
+            text("UPDATE rollup_state SET \"lastTransactionId\" = GREATEST(\"lastTransactionId\", :last_id), "
+                 "\"updatedAt\" = now() WHERE name = :name"),
+            {"last_id": last_id, "name": ROLLUP_NAME},
+        )
+        db.commit()
+        total += count
+        chunks += 1
+        after = last_id
+        if count < chunk_size:
+            break
+
+    if idle is not None:
+        _overlap_seen = idle
+    ROLLUP_ROWS.inc(total)
+    ROLLUP_REFRESH_SECONDS.observe(time.perf_counter() - start)
+    return total
+
+
+def _refresh_in_thread(max_chunks=None):
+    db = SessionLocal()
+    try:
+        return refresh_rollups(db, max_chunks=max_chunks)
+    finally:
+        db.close()
+
+
+async def refresh_if_stale():
+    # Called on reads; keeps the rollups within a few seconds of the ledger
+    # without making every request touch the transactions table. The refresh
+    # runs on the sync engine in a worker thread, off the event loop.
+    global _last_refresh
+    if time.monotonic() - _last_refresh < ROLLUP_REFRESH_INTERVAL or _refresh_lock.locked():
+        return
+    async with _refresh_lock:
+        _last_refresh = time.monotonic()
+        try:
+            await asyncio.to_thread(_refresh_in_thread, ROLLUP_REQUEST_CHUNKS)
+        except Exception as e:
+            print(f"Error refreshing sales rollups: {e}")
+
+
+async def refresh_now():
+    # Used when new transactions were stored: waits for any refresh in
+    # progress, then folds everything pending, so responses cached right
+    # after the notification already include the new rows.
+    global _last_refresh
+    async with _refresh_lock:
+        _last_refresh = time.monotonic()
+        return await asyncio.to_thread(_refresh_in_thread)
+
+
+async def folded_watermark(db):
+    """Highest transaction id folded into the rollups, and so normalized."""
+    return (await db.execute(
+        text("SELECT \"lastTransactionId\" FROM rollup_state WHERE name = :name"), {"name": ROLLUP_NAME}
+    )).scalar() or 0
+
+
+def rebuild_rollups(db, chunk_size=None):
+    db.execute(text("TRUNCATE daily_sales, daily_item_sales"))
+    db.execute(text("DELETE FROM rollup_state WHERE name = :name"), {"name": ROLLUP_NAME})
+    db.commit()
+    return refresh_rollups(db, chunk_size=chunk_size, overlap=0)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backfill or refresh the sales rollups.")
+    parser.add_argument("--rebuild", action="store_true", help="recompute everything from scratch")
+    parser.add_argument("--chunk-size", type=int, default=ROLLUP_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        if args.rebuild:
+            rows = rebuild_rollups(db, chunk_size=args.chunk_size)
+        else:
+            rows = refresh_rollups(db, chunk_size=args.chunk_size)
+        if rows is None:
+            print("Another rollup refresh is running; try again later.")
+        else:
+            print(f"Folded {rows} transactions into the rollups in {time.perf_counter() - start:.1f}s.")
+    finally:
+        db.close()
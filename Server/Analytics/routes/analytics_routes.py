@@ -1,15 +1,112 @@
-from fastapi import APIRouter
-from Analytics.services.analytics_service import (
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Analytics.auth import get_current_user_id
+from Analytics.database import get_db
+from Analytics.response_cache import cached
+from Analytics.services.analytics_services import (
     get_key_metrics,
-    get_monthly_sales
+    get_monthly_sales,
+    get_daily_sales,
+    get_item_sales,
+    get_item_breakdown,
+    get_related_items,
+    get_top_item_pairs,
 )
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
+# Every endpoint needs the Auth-Service JWT (cookie 'jwt' or Bearer header),
+# only returns the logged in user's data and takes an optional inclusive date
+# range: ?start=2025-04-01&end=2025-04-30
+# Responses are cached per user until new transactions are stored for them
+# (see Analytics/response_cache.py).
+
 @router.get("/key-metrics")
-def key_metrics():
-    return get_key_metrics()
+async def key_metrics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    return await cached(
+        user_id, "key-metrics", {"start": start, "end": end},
+        lambda: get_key_metrics(db, user_id, start, end),
+    )
 
 @router.get("/monthly-sales")
-def monthly_sales():
-    return get_monthly_sales()
+async def monthly_sales(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    return await cached(
+        user_id, "monthly-sales", {"start": start, "end": end},
+        lambda: get_monthly_sales(db, user_id, start, end),
+    )
+
+@router.get("/daily-sales")
+async def daily_sales(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    return await cached(
+        user_id, "daily-sales", {"start": start, "end": end},
+        lambda: get_daily_sales(db, user_id, start, end),
+    )
+
+@router.get("/item-sales")
+async def item_sales(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(20, ge=1, le=500),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    return await cached(
+        user_id, "item-sales", {"start": start, "end": end, "limit": limit},
+        lambda: get_item_sales(db, user_id, start, end, limit),
+    )
+
+@router.get("/item-breakdown")
+async def item_breakdown(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(20, ge=1, le=500),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    return await cached(
+        user_id, "item-breakdown", {"start": start, "end": end, "limit": limit},
+        lambda: get_item_breakdown(db, user_id, start, end, limit),
+    )
+
+@router.get("/related-items")
+async def related_items(
+    item: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=100),
+    by: Literal["count", "lift"] = "count",
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    return await cached(
+        user_id, "related-items", {"item": item, "limit": limit, "by": by},
+        lambda: get_related_items(db, user_id, item, limit, by),
+    )
+
+@router.get("/top-item-pairs")
+async def top_item_pairs(
+    limit: int = Query(20, ge=1, le=500),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    return await cached(
+        user_id, "top-item-pairs", {"limit": limit},
+        lambda: get_top_item_pairs(db, user_id, limit),
+    )
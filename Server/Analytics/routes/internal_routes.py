@@ -0,0 +1,49 @@
+import os
+from typing import List
+
+from fastapi import APIRouter, Header, HTTPException
+from pydantic import BaseModel
+
+from Analytics.basket_index import basket_index
+from Analytics.columnar_store import columnar_store
+from Analytics.inventory_reconciler import reconcile_if_stale
+from Analytics.response_cache import invalidate_user
+from Analytics.rollups import refresh_now
+
+router = APIRouter(prefix="/internal", tags=["Internal"])
+
+# Shared with the Auth-Service (INTERNAL_API_TOKEN in its .env). When unset the
+# endpoint is open, so keep it off public networks.
+INTERNAL_API_TOKEN = os.environ.get("INTERNAL_API_TOKEN")
+
+
+class TransactionsStored(BaseModel):
+    userIds: List[int]
+
+
+@router.post("/transactions-stored")
+async def transactions_stored(
+    body: TransactionsStored,
+    x_internal_token: str = Header(None),
+):
+    # Called by the Auth-Service after /api/transactions/store saves new rows.
+    if INTERNAL_API_TOKEN and x_internal_token != INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid internal token")
+
+    # Fold the new rows into the rollups before dropping the cached responses,
+    # otherwise the next view could cache the old totals again.
+    try:
+        await refresh_now()
+    except Exception as e:
+        print(f"Error refreshing sales rollups: {e}")
+
+    # Stock is caught up too, short of rows still settling (see inventory_reconciler.py).
+    await reconcile_if_stale()
+
+    user_ids = sorted(set(body.userIds))
+    for user_id in user_ids:
+        if columnar_store is not None:
+            columnar_store.mark_stale(user_id)
+        basket_index.mark_stale(user_id)
+        await invalidate_user(user_id)
+    return {"invalidated": user_ids}
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Analytics.auth import get_current_user_id
+from Analytics.database import get_db
+from Analytics.services.inventory_services import get_low_stock
+
+router = APIRouter(prefix="/inventory", tags=["Inventory"])
+
+# Needs the Auth-Service JWT like /analytics. Not cached: stock changes as
+# sales are reconciled, not only when transactions are stored.
+
+@router.get("/low-stock")
+async def low_stock(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    return await get_low_stock(db, user_id)
@@ -1,45 +1,90 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import get_db
-from models.transaction_model import transactions
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from datetime import datetime
+from Analytics.basket_index import basket_index
+from Analytics.columnar_store import columnar_store
+from Analytics.metrics import COLUMNAR_QUERY_SECONDS, QUERY_SECONDS
+from Analytics.models.rollup_model import DailySales, DailyItemSales
+from Analytics.models.transaction_model import Transaction
+from Analytics.rollups import refresh_if_stale
 
-def get_key_metrics():
-    db: Session = next(get_db())
+# All queries read the pre-aggregated daily rollups (see Analytics/rollups.py)
+# for one user, so each is a single range scan of that user's days on the
+# rollup primary key, whatever the number of transactions behind them.
+# With ANALYTICS_COLUMNAR_STORE=1 they are answered from the user's arrays in
+# memory instead (see Analytics/columnar_store.py).
 
-    # Total Revenue = Sum of (selling price * quantity)
-    total_revenue = db.query(
-        func.sum(transactions.sellingPrice * transactions.quantity)
-    ).scalar() or 0
+def _for_user(query, model, user_id, start=None, end=None, day=None):
+    query = query.where(model.UserId == user_id)
+    day = model.day if day is None else day
+    if start is not None:
+        query = query.where(day >= start)
+    if end is not None:
+        query = query.where(day <= end)
+    return query
 
-    # Total number of orders (each row = one transaction/order)
-    total_orders = db.query(transactions).count()
+async def _from_columns(db, user_id, endpoint, compute):
+    """Runs compute(columns) on the user's columnar store; None when the store
+    is off or does not hold the user."""
+    if columnar_store is None:
+        return None
+    columns = await columnar_store.get(db, user_id)
+    if columns is None:
+        return None
+    with COLUMNAR_QUERY_SECONDS.labels(endpoint).time():
+        return compute(columns)
+
+async def get_key_metrics(db: AsyncSession, user_id, start=None, end=None):
+    await refresh_if_stale()
+    result = await _from_columns(db, user_id, "key-metrics", lambda columns: columns.key_metrics(start, end))
+    if result is not None:
+        return result
+
+    with QUERY_SECONDS.labels("key-metrics").time():
+        # Total Revenue = sum of the line totals (sellingPrice is quantity x unit price)
+        # Total Orders = distinct order IDs per day
+        result = await db.execute(_for_user(
+            select(
+                func.coalesce(func.sum(DailySales.revenue), 0),
+                func.coalesce(func.sum(DailySales.orders), 0),
+                func.coalesce(func.sum(DailySales.lineItems), 0),
+            ),
+            DailySales, user_id, start, end,
+        ))
+        total_revenue, total_orders, total_items = result.one()
 
     # Average Order Value
-    avg_order_value = total_revenue / total_orders if total_orders else 0
+    avg_order_value = float(total_revenue) / total_orders if total_orders else 0
 
     # NOTE: Removed Customer Lifetime Value (no customer table or relation exists)
 
     return {
-        "totalRevenue": total_revenue,
+        "totalRevenue": float(total_revenue),
         "averageOrderValue": avg_order_value,
-        "totalOrders": total_orders
+        "totalOrders": int(total_orders),
+        "totalLineItems": int(total_items),
     }
 
-def get_monthly_sales():
-    db: Session = next(get_db())
+async def get_monthly_sales(db: AsyncSession, user_id, start=None, end=None):
+    await refresh_if_stale()
+    result = await _from_columns(db, user_id, "monthly-sales", lambda columns: columns.monthly_sales(start, end))
+    if result is not None:
+        return result
 
     # Group sales by month
-    results = db.query(
-        func.date_trunc('month', transactions.date).label("month"),
-        func.sum(transactions.sellingPrice * transactions.quantity).label("sales")
-    ).group_by("month").order_by("month").all()
+    with QUERY_SECONDS.labels("monthly-sales").time():
+        month = func.date_trunc('month', DailySales.day).label("month")
+        result = await db.execute(_for_user(
+            select(month, func.sum(DailySales.revenue).label("sales")),
+            DailySales, user_id, start, end,
+        ).group_by(month).order_by(month))
+        results = result.all()
 
     # Add dummy profit (e.g., 25% of sales as estimated profit)
     response = [
         {
             "month": month.strftime("%b"),
+            "year": month.year,
             "sales": float(sales),
             "profit": float(sales) * 0.25  # Dummy profit logic
         }
@@ -47,3 +92,82 @@ def get_monthly_sales():
     ]
 
     return response
+
+async def get_daily_sales(db: AsyncSession, user_id, start=None, end=None):
+    await refresh_if_stale()
+    result = await _from_columns(db, user_id, "daily-sales", lambda columns: columns.daily_sales(start, end))
+    if result is not None:
+        return result
+
+    with QUERY_SECONDS.labels("daily-sales").time():
+        result = await db.execute(_for_user(
+            select(DailySales.day, DailySales.revenue, DailySales.orders, DailySales.lineItems),
+            DailySales, user_id, start, end,
+        ).order_by(DailySales.day))
+        results = result.all()
+
+    return [
+        {"date": day.isoformat(), "sales": float(sales), "orders": int(orders), "lineItems": int(items)}
+        for day, sales, orders, items in results
+    ]
+
+async def get_item_sales(db: AsyncSession, user_id, start=None, end=None, limit=20):
+    await refresh_if_stale()
+    result = await _from_columns(db, user_id, "item-sales", lambda columns: columns.item_sales(start, end, limit))
+    if result is not None:
+        return result
+
+    with QUERY_SECONDS.labels("item-sales").time():
+        revenue = func.sum(DailyItemSales.revenue).label("revenue")
+        result = await db.execute(_for_user(
+            select(DailyItemSales.item, revenue, func.sum(DailyItemSales.lineItems)),
+            DailyItemSales, user_id, start, end,
+        ).group_by(DailyItemSales.item).order_by(revenue.desc()).limit(limit))
+        results = result.all()
+
+    return [
+        {"item": item, "sales": float(sales), "lineItems": int(items)}
+        for item, sales, items in results
+    ]
+
+async def get_item_breakdown(db: AsyncSession, user_id, start=None, end=None, limit=20):
+    await refresh_if_stale()
+    result = await _from_columns(db, user_id, "item-breakdown", lambda columns: columns.item_breakdown(start, end, limit))
+    if result is not None:
+        return result
+
+    # The rollups carry no quantities, so this reads the user's transactions
+    # (the numeric columns, through the (UserId, saleDate) index).
+    with QUERY_SECONDS.labels("item-breakdown").time():
+        result = await db.execute(_for_user(
+            select(Transaction.item, Transaction.quantityUnit, func.sum(Transaction.sellingPriceValue),
+                   func.count(), func.sum(Transaction.quantityValue)),
+            Transaction, user_id, start, end, day=Transaction.saleDate,
+        ).where(Transaction.saleDate.is_not(None)).group_by(Transaction.item, Transaction.quantityUnit))
+        results = result.all()
+
+    items = {}
+    for item, unit, sales, count, quantity in results:
+        entry = items.setdefault(item, {"item": item, "sales": 0.0, "lineItems": 0, "quantities": []})
+        entry["sales"] += float(sales or 0)
+        entry["lineItems"] += int(count)
+        if quantity:
+            entry["quantities"].append({"unit": unit, "quantity": float(quantity)})
+    total = sum(entry["sales"] for entry in items.values())
+    top = sorted(items.values(), key=lambda entry: -entry["sales"])[:limit]
+    for entry in top:
+        entry["revenueShare"] = round(entry["sales"] / total, 4) if total else 0
+    return top
+
+# Items bought together come from the per-user co-occurrence index (see
+# Analytics/basket_index.py) and cover the whole history, not a date range.
+
+async def get_related_items(db: AsyncSession, user_id, item, limit=10, by="count"):
+    await refresh_if_stale()
+    baskets = await basket_index.get(db, user_id)
+    return baskets.related_items(item, limit, by)
+
+async def get_top_item_pairs(db: AsyncSession, user_id, limit=20):
+    await refresh_if_stale()
+    baskets = await basket_index.get(db, user_id)
+    return baskets.top_pairs(limit)
@@ -0,0 +1,38 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Analytics.inventory_reconciler import reconcile_if_stale
+from Analytics.metrics import QUERY_SECONDS
+from Analytics.models.inventory_model import Inventory
+
+# Stock levels are depleted from the sales in transactions by
+# Analytics/inventory_reconciler.py, caught up here before each read.
+
+async def get_low_stock(db: AsyncSession, user_id):
+    await reconcile_if_stale()
+
+    # Compared live, so a restock entered since the last sale counts at once.
+    with QUERY_SECONDS.labels("low-stock").time():
+        result = await db.execute(
+            select(Inventory)
+            .where(
+                Inventory.UserId == user_id,
+                Inventory.lowStockThreshold.is_not(None),
+                Inventory.holdingQuantity <= Inventory.lowStockThreshold,
+            )
+            # Furthest below the threshold first; a threshold of 0 means "when out of stock".
+            .order_by(Inventory.holdingQuantity - Inventory.lowStockThreshold, Inventory.productName)
+        )
+        products = result.scalars().all()
+
+    return [
+        {
+            "id": product.id,
+            "productName": product.productName,
+            "holdingQuantity": float(product.holdingQuantity),
+            "unit": product.unit,
+            "lowStockThreshold": float(product.lowStockThreshold),
+            "lowStockSince": product.lowStockSince.isoformat() if product.lowStockSince else None,
+        }
+        for product in products
+    ]
@@ -0,0 +1,109 @@
+"use strict";
+
+/**
+ * Pre-aggregated sales per user per day and per user, day and item, kept up
+ * to date by the Analytics service (Analytics/rollups.py) from a watermark on
+ * transactions.id.
+ *
+ * @type {import('sequelize-cli').Migration}
+ */
+module.exports = {
+    async up(queryInterface, Sequelize) {
+        await queryInterface.createTable("daily_sales", {
+            UserId: {
+                type: Sequelize.INTEGER,
+                allowNull: false,
+                primaryKey: true,
+                references: {
+                    model: "users",
+                    key: "id",
+                },
+                onDelete: "CASCADE",
+            },
+            day: {
+                type: Sequelize.DATEONLY,
+                allowNull: false,
+                primaryKey: true,
+            },
+            revenue: {
+                type: Sequelize.DECIMAL(14, 2),
+                allowNull: false,
+                defaultValue: 0,
+            },
+            orders: {
+                type: Sequelize.INTEGER,
+                allowNull: false,
+                defaultValue: 0,
+            },
+            lineItems: {
+                type: Sequelize.INTEGER,
+                allowNull: false,
+                defaultValue: 0,
+            },
+        });
+
+        await queryInterface.createTable("daily_item_sales", {
+            UserId: {
+                type: Sequelize.INTEGER,
+                allowNull: false,
+                primaryKey: true,
+                references: {
+                    model: "users",
+                    key: "id",
+                },
+                onDelete: "CASCADE",
+            },
+            day: {
+                type: Sequelize.DATEONLY,
+                allowNull: false,
+                primaryKey: true,
+            },
+            item: {
+                type: Sequelize.STRING,
+                allowNull: false,
+                primaryKey: true,
+            },
+            revenue: {
+                type: Sequelize.DECIMAL(14, 2),
+                allowNull: false,
+                defaultValue: 0,
+            },
+            lineItems: {
+                type: Sequelize.INTEGER,
+                allowNull: false,
+                defaultValue: 0,
+            },
+        });
+
+        // One row per rollup job: the highest transactions.id already folded in.
+        await queryInterface.createTable("rollup_state", {
+            name: {
+                type: Sequelize.STRING,
+                allowNull: false,
+                primaryKey: true,
+            },
+            lastTransactionId: {
+                type: Sequelize.INTEGER,
+                allowNull: false,
+                defaultValue: 0,
+            },
+            updatedAt: {
+                allowNull: false,
+                type: Sequelize.DATE,
+                defaultValue: Sequelize.literal("CURRENT_TIMESTAMP"),
+            },
+        });
+
+        // Refreshing a day re-reads that user's transactions for the day.
+        await queryInterface.addIndex("transactions", ["UserId", "date"], {
+            name: "transactions_user_date_idx",
+        });
+    },
+
+    async down(queryInterface, Sequelize) {
+        await queryInterface.removeIndex("transactions", "transactions_user_date_idx");
+        await queryInterface.dropTable("rollup_state");
+        await queryInterface.dropTable("daily_item_sales");
+        await queryInterface.dropTable("daily_sales");
+    },
+};
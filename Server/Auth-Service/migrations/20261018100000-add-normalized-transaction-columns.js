@@ -0,0 +1,46 @@
+"use strict";
+
+/**
+ * Numeric copies of the free-text ledger columns, filled by the Analytics
+ * service (Analytics/normalize.py): quantity in a canonical unit (kg, L or
+ * pcs), the line total as a number and the sale date as a real DATE.
+ *
+ * @type {import('sequelize-cli').Migration}
+ */
+module.exports = {
+    async up(queryInterface, Sequelize) {
+        await queryInterface.addColumn("transactions", "quantityValue", {
+            type: Sequelize.DECIMAL(12, 3),
+            allowNull: true,
+        });
+
+        await queryInterface.addColumn("transactions", "quantityUnit", {
+            type: Sequelize.STRING(8),
+            allowNull: true,
+        });
+
+        await queryInterface.addColumn("transactions", "sellingPriceValue", {
+            type: Sequelize.DECIMAL(12, 2),
+            allowNull: true,
+        });
+
+        await queryInterface.addColumn("transactions", "saleDate", {
+            type: Sequelize.DATEONLY,
+            allowNull: true,
+        });
+
+        // Built without blocking inserts into a table that is already large.
+        await queryInterface.addIndex("transactions", ["UserId", "saleDate"], {
+            name: "transactions_user_sale_date_idx",
+            concurrently: true,
+        });
+    },
+
+    async down(queryInterface, Sequelize) {
+        await queryInterface.removeIndex("transactions", "transactions_user_sale_date_idx");
+        await queryInterface.removeColumn("transactions", "saleDate");
+        await queryInterface.removeColumn("transactions", "sellingPriceValue");
+        await queryInterface.removeColumn("transactions", "quantityUnit");
+        await queryInterface.removeColumn("transactions", "quantityValue");
+    },
+};
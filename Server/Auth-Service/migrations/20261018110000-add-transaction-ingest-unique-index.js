@@ -0,0 +1,59 @@
+"use strict";
+
+const BACKUP_TABLE = "transactions_removed_duplicates";
+
+/**
+ * One row per (UserId, orderID, item, date), so storing the same ledger page
+ * twice (a retried upload, or the OCR service's /ocr/ingest) inserts nothing
+ * the second time.
+ *
+ * Rows already stored twice are moved to transactions_removed_duplicates
+ * first, keeping the oldest copy in transactions. Rows stored before orderID
+ * existed all carry orderID '0', so check that table before dropping it;
+ * `down` puts its rows back. If any rows are moved, rebuild the analytics
+ * rollups afterwards:
+ *     python -m Analytics.rollups --rebuild     (from Server/)
+ *
+ * @type {import('sequelize-cli').Migration}
+ */
+module.exports = {
+    async up(queryInterface, Sequelize) {
+        const moved = await queryInterface.sequelize.transaction(async (transaction) => {
+            await queryInterface.sequelize.query(
+                `CREATE TABLE IF NOT EXISTS ${BACKUP_TABLE} (LIKE transactions INCLUDING DEFAULTS)`,
+                { transaction }
+            );
+            const [, result] = await queryInterface.sequelize.query(`
+                WITH moved AS (
+                    DELETE FROM transactions t
+                    USING transactions d
+                    WHERE t."UserId" = d."UserId" AND t."orderID" = d."orderID"
+                      AND t.item = d.item AND t.date = d.date AND t.id > d.id
+                    RETURNING t.*
+                )
+                INSERT INTO ${BACKUP_TABLE} SELECT * FROM moved
+            `, { transaction });
+            return result?.rowCount ?? 0;
+        });
+        if (moved) {
+            console.log(`Moved ${moved} duplicate transactions to ${BACKUP_TABLE}; rebuild the analytics rollups.`);
+        }
+
+        await queryInterface.addIndex("transactions", ["UserId", "orderID", "item", "date"], {
+            name: "transactions_user_order_item_date_key",
+            unique: true,
+            concurrently: true,
+        });
+    },
+
+    async down(queryInterface, Sequelize) {
+        await queryInterface.removeIndex("transactions", "transactions_user_order_item_date_key");
+        await queryInterface.sequelize.transaction(async (transaction) => {
+            await queryInterface.sequelize.query(
+                `INSERT INTO transactions SELECT * FROM ${BACKUP_TABLE} ON CONFLICT (id) DO NOTHING`,
+                { transaction }
+            );
+            await queryInterface.sequelize.query(`DROP TABLE ${BACKUP_TABLE}`, { transaction });
+        });
+    },
+};
@@ -0,0 +1,56 @@
+"use strict";
+
+/**
+ * Lets the Analytics service deplete stock from sales
+ * (Analytics/inventory_reconciler.py): an id to update products by, the unit
+ * holdingQuantity is counted in (fractions of a kg or L are kept), and a
+ * low-stock threshold with the time it was reached.
+ *
+ * @type {import('sequelize-cli').Migration}
+ */
+module.exports = {
+    async up(queryInterface, Sequelize) {
+        await queryInterface.addColumn("inventories", "id", {
+            type: Sequelize.INTEGER,
+            autoIncrement: true,
+            primaryKey: true,
+            allowNull: false,
+        });
+
+        await queryInterface.changeColumn("inventories", "holdingQuantity", {
+            type: Sequelize.DECIMAL(12, 3),
+            allowNull: false,
+        });
+
+        await queryInterface.addColumn("inventories", "unit", {
+            type: Sequelize.STRING(8),
+            allowNull: true,
+        });
+
+        await queryInterface.addColumn("inventories", "lowStockThreshold", {
+            type: Sequelize.DECIMAL(12, 3),
+            allowNull: true,
+        });
+
+        await queryInterface.addColumn("inventories", "lowStockSince", {
+            type: Sequelize.DATE,
+            allowNull: true,
+        });
+
+        await queryInterface.addIndex("inventories", ["UserId"], {
+            name: "inventories_user_idx",
+        });
+    },
+
+    async down(queryInterface, Sequelize) {
+        await queryInterface.removeIndex("inventories", "inventories_user_idx");
+        await queryInterface.removeColumn("inventories", "lowStockSince");
+        await queryInterface.removeColumn("inventories", "lowStockThreshold");
+        await queryInterface.removeColumn("inventories", "unit");
+        await queryInterface.changeColumn("inventories", "holdingQuantity", {
+            type: Sequelize.INTEGER,
+            allowNull: false,
+        });
+        await queryInterface.removeColumn("inventories", "id");
+    },
+};
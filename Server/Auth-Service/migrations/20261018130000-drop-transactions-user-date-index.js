@@ -0,0 +1,24 @@
+"use strict";
+
+/**
+ * The rollups recompute a day through transactions_user_sale_date_idx
+ * ("UserId", "saleDate") since the numeric columns were added, so the
+ * ("UserId", date) index from the rollup migration is no longer read and
+ * only slows inserts down.
+ *
+ * @type {import('sequelize-cli').Migration}
+ */
+module.exports = {
+    async up(queryInterface, Sequelize) {
+        await queryInterface.removeIndex("transactions", "transactions_user_date_idx", {
+            concurrently: true,
+        });
+    },
+
+    async down(queryInterface, Sequelize) {
+        await queryInterface.addIndex("transactions", ["UserId", "date"], {
+            name: "transactions_user_date_idx",
+            concurrently: true,
+        });
+    },
+};
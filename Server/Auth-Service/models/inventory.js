@@ -31,9 +31,23 @@ module.exports = (sequelize) => {
                 allowNull: false,
             },
             holdingQuantity: {
-                type: DataTypes.INTEGER,
+                type: DataTypes.DECIMAL(12, 3),
                 allowNull: false,
             },
+            // Depleted from sales by the Analytics service, converting the
+            // ledger's quantities into this unit (kg, gm, L, ml, pcs, dozen...).
+            unit: {
+                type: DataTypes.STRING(8),
+                allowNull: true,
+            },
+            lowStockThreshold: {
+                type: DataTypes.DECIMAL(12, 3),
+                allowNull: true,
+            },
+            lowStockSince: {
+                type: DataTypes.DATE,
+                allowNull: true,
+            },
         },
         {
             sequelize,
@@ -42,6 +42,23 @@ module.exports = (sequelize) => {
                 type: DataTypes.STRING,
                 allowNull: false,
             },
+            // Parsed from the text columns above by the Analytics service.
+            quantityValue: {
+                type: DataTypes.DECIMAL(12, 3),
+                allowNull: true,
+            },
+            quantityUnit: {
+                type: DataTypes.STRING(8),
+                allowNull: true,
+            },
+            sellingPriceValue: {
+                type: DataTypes.DECIMAL(12, 2),
+                allowNull: true,
+            },
+            saleDate: {
+                type: DataTypes.DATEONLY,
+                allowNull: true,
+            },
         },
         {
             sequelize,
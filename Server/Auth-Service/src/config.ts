@@ -8,3 +8,7 @@ if (!process.env.JWT_SECRET) {
 export const PORT = process.env.PORT || 3000;
 export const JWT_SECRET = process.env.JWT_SECRET as string;
 export const DATABASE_URL = process.env.DATABASE_URL || '';
+// Analytics service to notify when transactions are stored (cache invalidation);
+// notifications are skipped when unset.
+export const ANALYTICS_URL = process.env.ANALYTICS_URL || '';
+export const INTERNAL_API_TOKEN = process.env.INTERNAL_API_TOKEN || '';
@@ -1,5 +1,6 @@
 import { RequestHandler ,Request, Response, NextFunction } from 'express';
 import db from '../../models'; 
+import { notifyTransactionsStored } from '../utils/analyticsNotify';
 
 const User = (db as any).User;
 const Transaction = (db as any).Transaction;
@@ -23,8 +24,12 @@ export const storeRows:AsyncHandler  = async (req, res ,next) => {
       return res.status(400).json({ error: 'Invalid UserId(s) provided' });
     }
 
-    // Bulk insert rows into the Transaction table
-    const insertedRows = await Transaction.bulkCreate(rows);
+    // Bulk insert rows into the Transaction table; rows already stored for the
+    // same user, orderID, item and date (a retried upload) are skipped
+    const insertedRows = await Transaction.bulkCreate(rows, { ignoreDuplicates: true });
+
+    // Let the Analytics service drop these users' cached dashboards (fire-and-forget)
+    notifyTransactionsStored(userIds.map(Number));
 
     res.status(201).json({
       message: 'Rows stored successfully',
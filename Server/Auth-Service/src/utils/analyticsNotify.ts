@@ -0,0 +1,43 @@
+import http from 'http';
+import https from 'https';
+import { ANALYTICS_URL, INTERNAL_API_TOKEN } from '../config';
+
+/**
+ * Tells the Analytics service that new transactions were stored for these users,
+ * so it refreshes their rollups and drops their cached responses.
+ * Fire-and-forget: errors are logged and never fail the caller's request.
+ * @param userIds - The users whose transactions changed.
+ */
+export const notifyTransactionsStored = (userIds: number[]): void => {
+  if (!ANALYTICS_URL || userIds.length === 0) return;
+
+  try {
+    const url = new URL('/internal/transactions-stored', ANALYTICS_URL);
+    const body = JSON.stringify({ userIds });
+    const client = url.protocol === 'https:' ? https : http;
+
+    const req = client.request(
+      url,
+      {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Content-Length': Buffer.byteLength(body),
+          ...(INTERNAL_API_TOKEN ? { 'X-Internal-Token': INTERNAL_API_TOKEN } : {}),
+        },
+        timeout: 5000,
+      },
+      (res) => {
+        res.resume();
+        if (res.statusCode && res.statusCode >= 400) {
+          console.error(`Analytics notification failed with status ${res.statusCode}`);
+        }
+      }
+    );
+    req.on('timeout', () => req.destroy(new Error('Analytics notification timed out')));
+    req.on('error', (err) => console.error('Analytics notification error:', err.message));
+    req.end(body);
+  } catch (err) {
+    console.error('Analytics notification error:', (err as Error).message);
+  }
+};
@@ -0,0 +1,216 @@
+"""Per-user demand history and fitted forecasts, cached in memory.
+
+A user's model holds an items x days matrix of quantities sold (canonical
+units, see Analytics/normalize.py) and revenue, read from transactions,
+plus the smoothing state fitted over it. On each request only transactions
+with an id above the model's watermark are read. Rows for days after the
+last fitted day continue the fit from the saved state, and rows for the last
+day itself (the usual case, a day still being recorded) from the state
+before it; rows for earlier days (a ledger uploaded late) refit the matrix,
+which is one vectorized pass. Forecasts start today (tomorrow once today has
+sales), the days since the last sale taken as zero demand.
+"""
+import asyncio
+import datetime
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import text
+
+from Analytics.normalize import parse_date, parse_price, parse_quantity
+from Prediction.forecasting import SEASON, fit, forecast, initial_state, roll_forward
+
+HISTORY_DAYS = int(os.environ.get("PREDICTION_HISTORY_DAYS", 365))
+CACHE_USERS = int(os.environ.get("PREDICTION_CACHE_USERS", 200))
+# Seconds between checks for new transactions of the same user.
+REFRESH_INTERVAL = float(os.environ.get("PREDICTION_REFRESH_INTERVAL", 5))
+# Days of sales the average unit price (for expected revenue) is taken over.
+PRICE_WINDOW_DAYS = 30
+
+EPOCH = datetime.date(1970, 1, 1)
+
+# Rows the analytics rollups have already normalized are summed in SQL; newer
+# rows still carry only the ledger text and are parsed here. Both are read in
+# one statement, so a row the rollups normalize meanwhile is not missed.
+SALES_SQL = """
+    SELECT item, "quantityUnit", "saleDate", sum("quantityValue"), sum("sellingPriceValue"),
+           NULL AS quantity, NULL AS "sellingPrice", NULL AS date
+    FROM transactions
+    WHERE "UserId" = :user_id AND id > :after AND id <= :upto
+      AND "saleDate" IS NOT NULL AND "saleDate" >= :since
+    GROUP BY item, "quantityUnit", "saleDate"
+    UNION ALL
+    SELECT item, NULL, NULL, NULL, NULL, quantity, "sellingPrice", date
+    FROM transactions
+    WHERE "UserId" = :user_id AND id > :after AND id <= :upto AND "saleDate" IS NULL
+"""
+
+
+def day_number(day):
+    return (day - EPOCH).days
+
+
+def item_key(name, unit):
+    # Ledger spellings differ in case and spacing only as often as not.
+    return " ".join(name.lower().split()), unit
+
+
+class DemandModel:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.watermark = 0
+        self.names = []
+        self.units = []
+        self.index = {}
+        self.first_day = None
+        self.quantity = np.zeros((0, 0), dtype=np.float32)
+        self.revenue = np.zeros((0, 0), dtype=np.float32)
+        self.state = None
+        # The state before the last fitted day, to refit just that day.
+        self.checkpoint = None
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def refresh(self, db):
+        """Reads transactions stored since the last refresh and updates the fit."""
+        upto = (await db.execute(
+            text('SELECT max(id) FROM transactions WHERE "UserId" = :user_id'), {"user_id": self.user_id}
+        )).scalar() or 0
+        self.checked_at = time.monotonic()
+        if upto <= self.watermark:
+            return False
+
+        params = {"user_id": self.user_id, "after": self.watermark, "upto": upto}
+        since = datetime.date.today() - datetime.timedelta(days=HISTORY_DAYS)
+        sales = []
+        rows = (await db.execute(text(SALES_SQL), {**params, "since": since})).all()
+        for name, unit, day, quantity, revenue, quantity_text, price_text, date_text in rows:
+            if day is not None:
+                sales.append((name, unit, day, float(quantity or 0), float(revenue or 0)))
+                continue
+            day = parse_date(date_text)
+            if day is None or day < since:
+                continue
+            quantity, unit = parse_quantity(quantity_text)
+            sales.append((name, unit, day, quantity or 0.0, parse_price(price_text) or 0.0))
+        self.watermark = upto
+        if sales:
+            self.add_sales(sales)
+        return True
+
+    def add_sales(self, sales):
+        rows = np.array([self._row(name, unit) for name, unit, _, _, _ in sales])
+        days = np.array([day_number(day) for _, _, day, _, _ in sales])
+        refit = self.state is None or len(self.names) > self.quantity.shape[0]
+        if self.first_day is None:
+            self.first_day = int(days.min())
+        last_day = max(int(days.max()), self.first_day + self.quantity.shape[1] - 1)
+        # Keep a window of HISTORY_DAYS; moving its start means refitting.
+        first_day = max(min(self.first_day, int(days.min())), last_day - HISTORY_DAYS + 1)
+        if first_day != self.first_day:
+            refit = True
+        self._resize(first_day, last_day)
+
+        keep = days >= self.first_day
+        columns = days[keep] - self.first_day
+        np.add.at(self.quantity, (rows[keep], columns), np.array([s[3] for s in sales], dtype=np.float32)[keep])
+        np.add.at(self.revenue, (rows[keep], columns), np.array([s[4] for s in sales], dtype=np.float32)[keep])
+        state = None if refit else self.state
+        if state is not None and keep.any() and days[keep].min() <= state.fitted_through:
+            # Only the last day changed: continue from the state before it,
+            # unless the matrix is short enough that it shaped initial_state.
+            trailing = self.checkpoint is not None and days[keep].min() > self.checkpoint.fitted_through
+            state = self.checkpoint.copy() if trailing and self.quantity.shape[1] > 2 * SEASON else None
+        if state is None:
+            state = initial_state(self.quantity, self.first_day)
+        last_day = self.first_day + self.quantity.shape[1] - 1
+        if state.fitted_through < last_day:
+            if state.fitted_through < last_day - 1:
+                state = fit(self.quantity[:, :-1], self.first_day, state)
+            self.checkpoint = state.copy()
+            state = fit(self.quantity, self.first_day, state)
+        self.state = state
+
+    def _row(self, name, unit):
+        key = item_key(name, unit)
+        if key not in self.index:
+            self.index[key] = len(self.names)
+            self.names.append(name.strip())
+            self.units.append(unit)
+        return self.index[key]
+
+    def _resize(self, first_day, last_day):
+        shape = (len(self.names), last_day - first_day + 1)
+        # Columns of the old matrix that stay, and where they go in the new one
+        start = max(first_day - self.first_day, 0)
+        target = max(self.first_day - first_day, 0)
+        for attribute in ("quantity", "revenue"):
+            old = getattr(self, attribute)[:, start:]
+            new = np.zeros(shape, dtype=np.float32)
+            new[:old.shape[0], target:target + old.shape[1]] = old
+            setattr(self, attribute, new)
+        self.first_day = first_day
+
+    def predict(self, horizon, limit=None):
+        """Next `horizon` days of demand per item, by expected revenue."""
+        if self.state is None:
+            return {"startDate": None, "horizonDays": horizon, "expectedRevenue": 0.0, "items": []}
+        # Days since the last sale up to yesterday sold nothing; today may
+        # still be being recorded.
+        yesterday = day_number(datetime.date.today()) - 1
+        state = roll_forward(self.state, yesterday)
+        daily, low, high = forecast(state, horizon)
+        recent_quantity = self.quantity[:, -PRICE_WINDOW_DAYS:].sum(axis=1)
+        recent_revenue = self.revenue[:, -PRICE_WINDOW_DAYS:].sum(axis=1)
+        all_quantity = self.quantity.sum(axis=1)
+        unit_price = np.where(
+            recent_quantity > 0,
+            recent_revenue / np.maximum(recent_quantity, 1e-9),
+            self.revenue.sum(axis=1) / np.maximum(all_quantity, 1e-9),
+        )
+        totals = daily.sum(axis=1)
+        expected_revenue = totals * unit_price
+        order = np.argsort(-expected_revenue)
+        if limit:
+            order = order[:limit]
+
+        start = EPOCH + datetime.timedelta(days=state.fitted_through + 1)
+        return {
+            "startDate": start.isoformat(),
+            "horizonDays": horizon,
+            "expectedRevenue": round(float(expected_revenue.sum()), 2),
+            "items": [
+                {
+                    "item": self.names[i],
+                    "unit": self.units[i],
+                    "forecast": [round(float(value), 3) for value in daily[i]],
+                    "total": round(float(totals[i]), 3),
+                    "low": round(float(low[i]), 3),
+                    "high": round(float(high[i]), 3),
+                    "expectedRevenue": round(float(expected_revenue[i]), 2),
+                }
+                for i in order
+            ],
+        }
+
+
+_models = OrderedDict()
+
+
+async def get_model(db, user_id):
+    """Returns the user's model, loading it on first use and folding in new
+    transactions at most every REFRESH_INTERVAL seconds."""
+    model = _models.get(user_id)
+    if model is None:
+        model = _models[user_id] = DemandModel(user_id)
+        while len(_models) > CACHE_USERS:
+            _models.popitem(last=False)
+    _models.move_to_end(user_id)
+
+    if time.monotonic() - model.checked_at >= REFRESH_INTERVAL:
+        async with model.lock:
+            if time.monotonic() - model.checked_at >= REFRESH_INTERVAL:
+                await model.refresh(db)
+    return model
@@ -0,0 +1,106 @@
+"""Damped Holt-Winters smoothing with weekly seasonality, fitted for every
+item of a shop at once.
+
+Demand is a matrix of items x days. The smoothing recursion still steps
+through the days, but each step updates every item in one NumPy operation,
+so fitting 500 items over a year costs 365 vector updates instead of 500
+separate model fits. The state after the last fitted day is kept, so new
+days only continue the recursion from there.
+"""
+import os
+
+import numpy as np
+
+SEASON = 7
+ALPHA = float(os.environ.get("PREDICTION_ALPHA", 0.3))   # level
+BETA = float(os.environ.get("PREDICTION_BETA", 0.05))    # trend
+GAMMA = float(os.environ.get("PREDICTION_GAMMA", 0.15))  # weekday pattern
+PHI = float(os.environ.get("PREDICTION_PHI", 0.9))       # trend damping
+# z for the two-sided 80% interval around the forecast
+INTERVAL_Z = 1.2816
+
+
+class SmoothingState:
+    """Per-item level, trend, weekday offsets and one-step error statistics
+    after the day `fitted_through` (a day number, see fit())."""
+
+    def __init__(self, items, first_day):
+        self.level = np.zeros(items, dtype=np.float32)
+        self.trend = np.zeros(items, dtype=np.float32)
+        # Indexed by day number % 7, so offsets stay on their weekday.
+        self.season = np.zeros((items, SEASON), dtype=np.float32)
+        self.squared_error = np.zeros(items, dtype=np.float32)
+        self.steps = 0
+        self.fitted_through = first_day - 1
+
+    def copy(self):
+        state = SmoothingState(0, 0)
+        state.level, state.trend = self.level.copy(), self.trend.copy()
+        state.season, state.squared_error = self.season.copy(), self.squared_error.copy()
+        state.steps, state.fitted_through = self.steps, self.fitted_through
+        return state
+
+
+def initial_state(demand, first_day):
+    """Starts the level at the first week's mean and the weekday offsets at
+    the first two weeks' deviations from it; there is no trend yet."""
+    state = SmoothingState(demand.shape[0], first_day)
+    head = demand[:, :SEASON * 2]
+    if head.shape[1]:
+        state.level[:] = head.mean(axis=1)
+    if head.shape[1] >= SEASON * 2:
+        days = first_day + np.arange(head.shape[1])
+        for weekday in range(SEASON):
+            state.season[:, weekday] = head[:, days % SEASON == weekday].mean(axis=1) - state.level
+    return state
+
+
+def fit(demand, first_day, state=None):
+    """Runs the smoothing over the days of `demand` after state.fitted_through.
+
+    demand holds one row per item and one column per day, column 0 being day
+    number `first_day`. Without a state the whole matrix is fitted from
+    scratch. Returns the state after the last column.
+    """
+    if state is None:
+        state = initial_state(demand, first_day)
+    level, trend, season = state.level, state.trend, state.season
+    for column in range(state.fitted_through + 1 - first_day, demand.shape[1]):
+        day = first_day + column
+        actual = demand[:, column]
+        offset = season[:, day % SEASON]
+        expected = level + PHI * trend
+        error = actual - (expected + offset)
+        new_level = ALPHA * (actual - offset) + (1 - ALPHA) * expected
+        trend = BETA * (new_level - level) + (1 - BETA) * PHI * trend
+        season[:, day % SEASON] = GAMMA * (actual - new_level) + (1 - GAMMA) * offset
+        level = new_level
+        state.squared_error += error * error
+        state.steps += 1
+    state.level, state.trend = level.astype(np.float32), trend.astype(np.float32)
+    state.fitted_through = first_day + demand.shape[1] - 1
+    return state
+
+
+def roll_forward(state, through):
+    """A copy of the state continued with zero demand up to day `through`,
+    for days on which nothing was sold."""
+    days = through - state.fitted_through
+    if days <= 0:
+        return state
+    return fit(np.zeros((len(state.level), days), dtype=np.float32), state.fitted_through + 1, state.copy())
+
+
+def forecast(state, horizon):
+    """Returns (daily, low, high): the items x horizon forecast for the days
+    after state.fitted_through, and an 80% range for each item's total over
+    those days. Demand is never negative, so all are clipped at zero."""
+    steps = np.arange(1, horizon + 1)
+    damping = np.cumsum(PHI ** steps)
+    days = state.fitted_through + steps
+    daily = np.maximum(state.level[:, None] + state.trend[:, None] * damping + state.season[:, days % SEASON], 0)
+    sigma = np.sqrt(state.squared_error / max(state.steps, 1))
+    # The error of day h grows like sqrt(h); the days' errors are taken as independent.
+    spread = INTERVAL_Z * sigma * np.sqrt(steps.sum())
+    total = daily.sum(axis=1)
+    return daily, np.maximum(total - spread, 0), total + spread
@@ -0,0 +1,35 @@
+# Server/Prediction/main.py
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from Analytics.database import async_engine
+from Prediction.routes.prediction_routes import router as prediction_router
+
+# Shares the database settings (DATABASE_URL, DB_POOL_*) and JWT_SECRET with
+# the Analytics service.
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close pooled connections on shutdown
+    await async_engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[os.environ.get("CORS_ORIGIN", "http://localhost:5173")],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+app.include_router(prediction_router)
+
+@app.get("/")
+def root():
+    return {"message": "Welcome to LedgerSense Predictions API"}
+
+# You can run this from Server/ via: uvicorn Prediction.main:app --port 8001 --reload
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Analytics.auth import get_current_user_id
+from Analytics.database import get_db
+from Prediction.demand_models import get_model
+
+router = APIRouter(prefix="/predictions", tags=["Predictions"])
+
+# Needs the Auth-Service JWT like the analytics endpoints and only forecasts
+# the logged in user's items.
+
+@router.get("/demand")
+async def demand(
+    days: int = Query(14, ge=1, le=90),
+    limit: int = Query(50, ge=1, le=500),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    model = await get_model(db, user_id)
+    return model.predict(days, limit)
@@ -0,0 +1,200 @@
+"""Times the OCR pipeline stage by stage on synthetic ledger pages.
+
+    python benchmarks/ocr_benchmark.py --pages 10 --rows 25 --skew 1.5
+    python benchmarks/ocr_benchmark.py --no-ocr          # preprocessing only
+
+Each run writes a JSON report (per-stage latency, pages/sec, peak memory and
+cell accuracy against the generated ground truth) so runs can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ocr_decode  # noqa: E402
+import table_log  # noqa: E402
+from synthetic_ledger import FONTS, HEADERS, render_ledger  # noqa: E402
+
+STAGES = ['decode', 'binarize', 'grid', 'ocr', 'clean']
+
+
+def summarize(samples):
+    values = np.array(samples, dtype=np.float64)
+    if not len(values):
+        return None
+    return {
+        "count": int(len(values)),
+        "mean_ms": round(float(values.mean()) * 1000, 3),
+        "p50_ms": round(float(np.percentile(values, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(values, 95)) * 1000, 3),
+        "max_ms": round(float(values.max()) * 1000, 3),
+        "total_s": round(float(values.sum()), 4),
+    }
+
+
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+def cell_accuracy(df, truth):
+    """Fraction of ground-truth cells found with the same text in the same
+    row and column; missing rows or columns count as wrong."""
+    total = len(truth) * len(HEADERS)
+    if df is None or df.empty:
+        return 0, total
+    correct = 0
+    for c, header in enumerate(HEADERS):
+        if header not in df:
+            continue
+        predicted = df[header].tolist()
+        for r, row in enumerate(truth):
+            if r < len(predicted) and normalize(predicted[r]) == normalize(row[c]):
+                correct += 1
+    return correct, total
+
+
+def run_page(page, truth, ocr_engine, mode, encoding):
+    timings = {}
+    ok, encoded = cv2.imencode(encoding, page)
+
+    start = time.perf_counter()
+    # Same decode as uploads: reduced gray decode, resize to the target DPI and deskew.
+    img = ocr_decode.decode_page(encoded.tobytes(), 'page')
+    timings['decode'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    gray, blurred = table_log.process_image(img)
+    timings['binarize'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    horizontal_lines, vertical_lines = table_log.get_table_structure(blurred)
+    timings['grid'] = time.perf_counter() - start
+
+    result = {
+        "page_shape": list(img.shape),
+        "rows_detected": max(0, len(horizontal_lines) - 1),
+        "columns_detected": max(0, len(vertical_lines) - 1),
+        "rows_expected": len(truth),
+    }
+    if ocr_engine is None:
+        return timings, result
+
+    start = time.perf_counter()
+    table_data = table_log.extract_table(ocr_engine, gray, horizontal_lines, vertical_lines, mode=mode, clean=False)
+    timings['ocr'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        df = table_log.clean_table_data(table_data)
+    except Exception as e:
+        print(f"Cleaning failed: {e}")
+        df = None
+    timings['clean'] = time.perf_counter() - start
+
+    result["cells_correct"], result["cells_total"] = cell_accuracy(df, truth)
+    return timings, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=20)
+    parser.add_argument('--empty-rows', type=int, default=5)
+    parser.add_argument('--width', type=int, default=1600, help="page width in pixels")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--font', choices=sorted(FONTS), default='script')
+    parser.add_argument('--font-path', help="TrueType handwriting font to use instead of a Hershey face")
+    parser.add_argument('--noise', type=float, default=8.0)
+    parser.add_argument('--skew', type=float, default=0.0, help="page rotation in degrees")
+    parser.add_argument('--encoding', default='.jpg', help="format pages are encoded to before decoding")
+    parser.add_argument('--mode', choices=table_log.RECOGNITION_MODES, default=table_log.RECOGNITION_MODE)
+    parser.add_argument('--no-ocr', action='store_true', help="skip recognition and cleaning")
+    parser.add_argument('--warmup', type=int, default=1, help="untimed pages run first")
+    parser.add_argument('--output', help="report path (default: benchmarks/results/ocr-<timestamp>.json)")
+    args = parser.parse_args()
+
+    ocr_engine = None
+    if not args.no_ocr:
+        ocr_engine = table_log.config_ocr_engine()
+        if ocr_engine is None:
+            sys.exit("PaddleOCR is not available; run with --no-ocr to time preprocessing only.")
+
+    def page_for(k):
+        return render_ledger(rows=args.rows, empty_rows=args.empty_rows, width=args.width,
+                             seed=args.seed + k, font=args.font, font_path=args.font_path,
+                             noise=args.noise, skew=args.skew)
+
+    for k in range(args.warmup):
+        run_page(*page_for(args.pages + k), ocr_engine, args.mode, args.encoding)
+
+    samples = {stage: [] for stage in STAGES}
+    per_page = []
+    peak_traced = 0
+    tracemalloc.start()
+    for k in range(args.pages):
+        # Rendering is not part of the pipeline, so it happens outside the timings.
+        page, truth = page_for(k)
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        timings, result = run_page(page, truth, ocr_engine, args.mode, args.encoding)
+        _, peak = tracemalloc.get_traced_memory()
+        peak_traced = max(peak_traced, peak - baseline)
+        for stage, seconds in timings.items():
+            samples[stage].append(seconds)
+        result["seconds"] = round(sum(timings.values()), 4)
+        per_page.append(result)
+        print(f"page {k + 1}/{args.pages}: {result['seconds']:.3f}s "
+              f"grid {result['rows_detected']}x{result['columns_detected']}"
+              + (f" cells {result['cells_correct']}/{result['cells_total']}" if 'cells_total' in result else ""))
+    tracemalloc.stop()
+
+    pipeline_seconds = sum(page["seconds"] for page in per_page)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != 'output'},
+        "ocr_config": table_log.ocr_config_fingerprint(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+        },
+        "pages": args.pages,
+        "pages_per_sec": round(args.pages / pipeline_seconds, 3) if pipeline_seconds else None,
+        "stages": {stage: summarize(values) for stage, values in samples.items() if values},
+        # Python-side allocations (NumPy/OpenCV arrays included, Paddle's own
+        # allocator not); max RSS covers the whole process.
+        "peak_traced_mb_per_page": round(peak_traced / 2**20, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+        "per_page": per_page,
+    }
+    if ocr_engine is not None:
+        correct = sum(page["cells_correct"] for page in per_page)
+        total = sum(page["cells_total"] for page in per_page)
+        report["cell_accuracy"] = round(correct / total, 4) if total else None
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         f"ocr-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"pages/sec: {report['pages_per_sec']}")
+    for stage, stats in report["stages"].items():
+        print(f"  {stage:>8}: mean {stats['mean_ms']:.1f} ms  p95 {stats['p95_ms']:.1f} ms")
+    if "cell_accuracy" in report:
+        print(f"cell accuracy: {report['cell_accuracy']:.2%}")
+    print(f"Report written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import importlib.util
+import os
+import random
+
+import cv2
+import numpy as np
+
+
+def _load_dummy_generator():
+    # The item catalogue and quantity formatting are shared with the analytics
+    # dummy data generator so synthetic pages look like real ledger entries.
+    # Loaded from its file, so Analytics modules (its main.py, profiler.py)
+    # never shadow the OCR service's on sys.path.
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Analytics',
+                        'dummy_transaction_generator.py')
+    spec = importlib.util.spec_from_file_location('analytics_dummy_transaction_generator', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+_dummy_generator = _load_dummy_generator()
+items, format_quantity = _dummy_generator.items, _dummy_generator.format_quantity
+
+HEADERS = ["OrderID", "Item", "Quantity", "Selling Price"]
+# Relative column widths, roughly those of the printed ledger sheets.
+COLUMN_WEIGHTS = [0.17, 0.37, 0.14, 0.32]
+
+# Hershey script faces are the closest OpenCV has to handwriting; a TrueType
+# handwriting font can be used instead through the font_path option.
+FONTS = {
+    'script': cv2.FONT_HERSHEY_SCRIPT_SIMPLEX,
+    'script-complex': cv2.FONT_HERSHEY_SCRIPT_COMPLEX,
+    'simplex': cv2.FONT_HERSHEY_SIMPLEX,
+    'duplex': cv2.FONT_HERSHEY_DUPLEX,
+}
+
+
+def generate_ledger_rows(rows, rng):
+    """Ground-truth rows as the OCR pipeline should return them, with the
+    OrderID forward-filled and written only on an order's first line."""
+    truth = []
+    written = []
+    order_id = 0
+    names = list(items.keys())
+    while len(truth) < rows:
+        order_id += 1
+        for k, name in enumerate(rng.sample(names, rng.randint(2, 7))):
+            if len(truth) >= rows:
+                break
+            item = items[name]
+            quantity = rng.choice(item["unit_options"])
+            price = int(quantity * item["price"])
+            row = [str(order_id), name, format_quantity(quantity, item["unit"]), str(price)]
+            truth.append(row)
+            written.append([row[0] if k == 0 else ""] + row[1:])
+    return truth, written
+
+
+def _draw_text_cv2(page, text, x, y, height, font, rng):
+    scale = cv2.getFontScaleFromHeight(font, height, 2)
+    # Hand-written entries wander a little around the baseline.
+    dx = rng.randint(0, max(1, height // 2))
+    dy = rng.randint(-height // 6, height // 6 + 1)
+    ink = rng.randint(10, 70)
+    cv2.putText(page, text, (x + dx, y + dy), font, scale, (ink, ink // 2, ink // 3), 2, cv2.LINE_AA)
+
+
+def _draw_text_ttf(page, text, x, y, height, font, rng):
+    from PIL import Image, ImageDraw
+
+    image = Image.fromarray(page)
+    draw = ImageDraw.Draw(image)
+    dx = rng.randint(0, max(1, height // 2))
+    draw.text((x + dx, y - height), text, font=font, fill=(30, 20, 90))
+    page[:] = np.asarray(image)
+
+
+def render_ledger(rows=20, empty_rows=5, width=1600, row_height=70, seed=0,
+                  font='script', font_path=None, noise=8.0, skew=0.0, blur=1):
+    """Renders a ruled ledger page and returns (BGR image, ground-truth rows).
+
+    noise is the standard deviation of Gaussian pixel noise, skew the page
+    rotation in degrees, blur the Gaussian blur kernel radius (0 disables).
+    """
+    rng = random.Random(seed)
+    truth, written = generate_ledger_rows(rows, rng)
+
+    margin = row_height
+    total_rows = 1 + len(written) + empty_rows
+    height = total_rows * row_height + 2 * margin
+    # Slightly tinted paper, like photos of the real sheets.
+    page = np.full((height, width, 3), (235, 228, 222), np.uint8)
+
+    table_width = width - 2 * margin
+    xs = [margin]
+    for weight in COLUMN_WEIGHTS:
+        xs.append(xs[-1] + int(weight * table_width))
+    ys = [margin + r * row_height for r in range(total_rows + 1)]
+    for y in ys:
+        cv2.line(page, (xs[0], y), (xs[-1], y), (40, 40, 40), 2)
+    for x in xs:
+        cv2.line(page, (x, ys[0]), (x, ys[-1]), (40, 40, 40), 2)
+
+    text_height = int(row_height * 0.4)
+    if font_path:
+        from PIL import ImageFont
+        draw_text = _draw_text_ttf
+        face = ImageFont.truetype(font_path, int(row_height * 0.55))
+    else:
+        draw_text = _draw_text_cv2
+        face = FONTS[font]
+
+    header_font = cv2.FONT_HERSHEY_TRIPLEX
+    for c, header in enumerate(HEADERS):
+        _draw_text_cv2(page, header, xs[c] + 15, ys[1] - row_height // 3, text_height, header_font, rng)
+    for r, row in enumerate(written, start=1):
+        baseline = ys[r + 1] - row_height // 3
+        for c, text in enumerate(row):
+            if text:
+                draw_text(page, text, xs[c] + 15, baseline, text_height, face, rng)
+
+    if blur:
+        page = cv2.GaussianBlur(page, (2 * blur + 1, 2 * blur + 1), 0)
+    if skew:
+        center = (width / 2, height / 2)
+        matrix = cv2.getRotationMatrix2D(center, skew, 1.0)
+        page = cv2.warpAffine(page, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=(235, 228, 222))
+    if noise:
+        np_rng = np.random.default_rng(seed)
+        page = np.clip(page + np_rng.normal(0, noise, page.shape), 0, 255).astype(np.uint8)
+
+    return page, truth
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write synthetic ledger pages and their ground truth.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--font', choices=sorted(FONTS), default='script')
+    parser.add_argument('--font-path')
+    parser.add_argument('--noise', type=float, default=8.0)
+    parser.add_argument('--skew', type=float, default=0.0)
+    args = parser.parse_args()
+
+    import json
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for p in range(args.pages):
+        page, truth = render_ledger(rows=args.rows, seed=args.seed + p, font=args.font,
+                                    font_path=args.font_path, noise=args.noise, skew=args.skew)
+        cv2.imwrite(os.path.join(args.output_dir, f"page-{p + 1:03d}.png"), page)
+        with open(os.path.join(args.output_dir, f"page-{p + 1:03d}.json"), 'w') as f:
+            json.dump({"headers": HEADERS, "rows": truth}, f, indent=2)
+    print(f"Wrote {args.pages} page(s) to {args.output_dir}")
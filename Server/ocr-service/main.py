@@ -1,36 +1,116 @@
-from table_log import result_table_log
-from flask import Flask, request, jsonify, Response
-from flask_cors import CORS 
-import numpy as np
-import cv2
+from ocr_pool import OCRWorkerPool
+from ocr_jobs import OCRJobManager, QueueFullError
+from ocr_bulk import iter_pages, spool_uploads, stream_pages
+from ocr_decode import MAX_IMAGE_BYTES, PageError, decode_page
+from ocr_cache import OCRResultCache
+from ocr_ingest import IngestError, authenticated_user_id, ingest_enabled, ingest_table, sale_date
+from table_log import ocr_config_fingerprint
+from ocr_metrics import JOBS_PENDING, REQUESTS_IN_FLIGHT, REQUEST_SECONDS, WORKERS_LOADED, observe_stage, render_metrics
+from profiler import SamplingProfiler
+from flask import Flask, request, jsonify, Response, g, stream_with_context
+from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
+import time
 
 app = Flask(__name__)
 CORS(app)
+# Whole requests (a bulk upload included) are refused with 413 above this;
+# single images are limited by OCR_MAX_IMAGE_BYTES in ocr_decode.py.
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('OCR_MAX_REQUEST_BYTES', 512 * 1024 * 1024))
 
-@app.route('/ocr', methods=['POST'])
-def process_image():
-    if 'image' not in request.files:
-        return jsonify({"error": "No image file provided (field name should be 'image')"}), 400
-    
-    image_file = request.files['image']
+# Long-lived OCR workers; models are loaded once per worker at startup.
+ocr_pool = OCRWorkerPool()
+OCR_TIMEOUT = float(os.environ.get('OCR_TIMEOUT', 300))
+# Repeat uploads of the same photo are answered from here without running OCR.
+ocr_cache = OCRResultCache(ocr_config_fingerprint())
+ocr_jobs = OCRJobManager(ocr_pool, cache=ocr_cache)
+JOBS_PENDING.set_function(ocr_jobs.pending)
+WORKERS_LOADED.set_function(ocr_pool.loaded_workers)
+# The /debug/profile endpoints are only served when this is set.
+PROFILER_ENABLED = os.environ.get('OCR_PROFILER_ENABLED', '').lower() in ('1', 'true', 'yes')
+web_profiler = SamplingProfiler()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+
+@app.after_request
+def record_status(response):
+    g.status = response.status_code
+    g.streamed = response.is_streamed
+    return response
+
+@app.teardown_request
+def record_request(exc=None):
+    # A response streamed with stream_with_context is torn down twice: when
+    # the view returns and again when the stream ends. Only the last one
+    # counts, so bulk uploads are timed until their last page.
+    if g.pop('streamed', False) or 'request_start' not in g:
+        return
+    REQUESTS_IN_FLIGHT.dec()
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = g.get('status', 500)
+    REQUEST_SECONDS.labels(request.method, endpoint, status).observe(time.perf_counter() - g.pop('request_start'))
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": f"Upload is larger than {app.config['MAX_CONTENT_LENGTH']} bytes"}), 413
+
+def read_uploaded_image():
+    try:
+        files = request.files
+    except RequestEntityTooLarge as e:
+        return None, request_too_large(e)
+    if 'image' not in files:
+        return None, (jsonify({"error": "No image file provided (field name should be 'image')"}), 400)
+
+    image_file = files['image']
 
     if image_file.filename == '':
-        return jsonify({"error": "No selected file"}), 400
-    
+        return None, (jsonify({"error": "No selected file"}), 400)
+
+    start = time.perf_counter()
     try:
-        img_bytes = image_file.read()
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        if img is None:
-            return jsonify({"error": "Could not decode image. Invalid image format?"}), 400
-        
-        ocr_result = result_table_log(img)
-        result_json = ocr_result.to_json()
-        print("Extracted OCR Data:", result_json)  # Print the extracted data in the console
+        # Decoded straight to a gray page of bounded size; the upload's bytes
+        # are dropped as soon as this returns.
+        img = decode_page(image_file.read(MAX_IMAGE_BYTES + 1), image_file.filename)
+    except PageError as e:
+        return None, (jsonify({"error": str(e)}), e.status)
+    observe_stage('decode', time.perf_counter() - start)
+    return img, None
+
+def run_ocr(img, typed=False):
+    cache_key = ocr_cache.key(img, variant='typed' if typed else None)
+    result_json = ocr_cache.get(cache_key)
+    if result_json is None:
+        result_json = ocr_pool.run(img, typed=typed, timeout=OCR_TIMEOUT)
+        ocr_cache.put(cache_key, result_json)
+    return result_json
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    status = {
+        "ready": ocr_pool.is_ready(),
+        "workers": ocr_pool.processes,
+        "loaded_workers": ocr_pool.loaded_workers(),
+    }
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route('/ocr', methods=['POST'])
+def process_image():
+    try:
+        img, error_response = read_uploaded_image()
+        if error_response:
+            return error_response
+
+        # ?typed=true adds parsed OrderID, QuantityValue, Unit and SellingPriceValue columns.
+        typed = request.args.get('typed', '').lower() in ('1', 'true', 'yes')
+        result_json = run_ocr(img, typed=typed)
         if result_json is None or result_json == '{}' or len(result_json) == 0:
             return jsonify({"error": "No text found in the image"}), 400
+        print(f"Extracted OCR table ({len(result_json)} bytes)")
         # result = {
         #     "message": "Image received successfully",
         #     "filename": image_file.filename,
@@ -38,11 +118,126 @@ def process_image():
         #     "detected_text": result_json
         # }
         return result_json, 200
-    
+
     except Exception as e:
         print(f"Error processing image: {e}")
         return jsonify({"error": "An error occurred while processing the image"}), 500
-    
+
+@app.route('/ocr/ingest', methods=['POST'])
+def ingest_image():
+    if not ingest_enabled():
+        return jsonify({"error": "Ingest is disabled (set OCR_INGEST_DATABASE_URL)"}), 404
+    try:
+        user_id = authenticated_user_id(request)
+        # Either an image to OCR (multipart, with a 'date' field) or a table
+        # already returned by /ocr and reviewed: {"date": ..., "table": {...}}
+        if request.is_json:
+            body = request.get_json(silent=True) or {}
+            date = sale_date(body.get('date'))
+            table = body.get('table')
+        else:
+            date = sale_date(request.form.get('date'))
+            img, error_response = read_uploaded_image()
+            if error_response:
+                return error_response
+            table = run_ocr(img)
+            if not table or table == '{}':
+                return jsonify({"error": "No text found in the image"}), 400
+        result = ingest_table(user_id, date, table)
+        print(f"Ingested {result['inserted']} of {result['received']} OCR rows for user {user_id}")
+        return jsonify(result), 201
+
+    except IngestError as e:
+        return jsonify({"error": str(e)}), e.status
+    except RequestEntityTooLarge as e:
+        return request_too_large(e)
+    except Exception as e:
+        print(f"Error ingesting OCR table: {e}")
+        return jsonify({"error": "An error occurred while storing the table"}), 500
+
+@app.route('/ocr/bulk', methods=['POST'])
+def process_bulk():
+    files = request.files.getlist('images') + request.files.getlist('image')
+    files = [f for f in files if f.filename != '']
+    if not files:
+        return jsonify({"error": "No files provided (field name should be 'images')"}), 400
+
+    # Pages are decoded lazily and streamed back as NDJSON in completion order.
+    uploads = spool_uploads(files)
+    return Response(
+        stream_with_context(stream_pages(ocr_pool, iter_pages(uploads), cache=ocr_cache)),
+        mimetype='application/x-ndjson',
+    )
+
+@app.route('/ocr/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(ocr_cache.stats()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/debug/profile', methods=['GET'])
+def profile_status():
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "Profiling is disabled (set OCR_PROFILER_ENABLED=1)"}), 404
+    return jsonify({
+        "running": web_profiler.running(),
+        "samples": web_profiler.samples,
+        "top": web_profiler.top(),
+    }), 200
+
+@app.route('/debug/profile/start', methods=['POST'])
+def start_profile():
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "Profiling is disabled (set OCR_PROFILER_ENABLED=1)"}), 404
+    web_profiler.start()
+    ocr_pool.set_profiling(True)
+    return jsonify({"running": True}), 200
+
+@app.route('/debug/profile/stop', methods=['POST'])
+def stop_profile():
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "Profiling is disabled (set OCR_PROFILER_ENABLED=1)"}), 404
+    ocr_pool.set_profiling(False)
+    web_profiler.stop()
+    path = web_profiler.write(f"ocr-web-{os.getpid()}")
+    # Workers write their own ocr-worker-<pid>.folded files next to this one
+    # once they notice the flag is cleared.
+    return jsonify({
+        "running": False,
+        "samples": web_profiler.samples,
+        "profile": path,
+        "top": web_profiler.top(),
+    }), 200
+
+@app.route('/ocr/jobs', methods=['POST'])
+def submit_ocr_job():
+    try:
+        img, error_response = read_uploaded_image()
+        if error_response:
+            return error_response
+
+        job_id = ocr_jobs.submit(img, filename=request.files['image'].filename)
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "5"}
+    except Exception as e:
+        print(f"Error submitting OCR job: {e}")
+        return jsonify({"error": "An error occurred while submitting the image"}), 500
+
+@app.route('/ocr/jobs/<job_id>', methods=['GET'])
+def get_ocr_job(job_id):
+    job = ocr_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(job), 200
+
 if __name__ == '__main__':
+    ocr_pool.start()
     port = int(os.environ.get('PORT', 5003))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    # threaded=True lets several uploads wait on the pool at once; the reloader
+    # is disabled because it would start a second set of OCR workers.
+    app.run(host='0.0.0.0', port=port, debug=True, threaded=True, use_reloader=False)
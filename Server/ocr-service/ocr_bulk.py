@@ -0,0 +1,208 @@
+import io
+import json
+import os
+import queue
+import shutil
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+
+from ocr_decode import (MAX_IMAGE_BYTES, MAX_IMAGE_PIXELS, PAGE_MAX_SIDE, TARGET_DPI, PageError, PageTooLarge,
+                        decode_page, normalize_page)
+from ocr_metrics import observe_stage
+
+# Pages decoded ahead of the workers, per worker. Keeps every core busy while
+# only a handful of decoded pages are held in memory at once.
+PAGES_IN_FLIGHT_PER_WORKER = int(os.environ.get('OCR_BULK_PAGES_PER_WORKER', 2))
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+PDF_DPI = int(os.environ.get('OCR_PDF_DPI', TARGET_DPI))
+# Uploads larger than this are spooled to disk while pages are processed.
+SPOOL_MAX_BYTES = int(os.environ.get('OCR_BULK_SPOOL_BYTES', 8 * 1024 * 1024))
+
+
+def _iter_tiff(stream, source):
+    from PIL import Image, ImageSequence
+
+    with Image.open(stream) as tiff:
+        # Frames are decoded one at a time as the iterator advances.
+        for frame in ImageSequence.Iterator(tiff):
+            if frame.width * frame.height > MAX_IMAGE_PIXELS:
+                raise PageTooLarge(f"A page of {source} has more than {MAX_IMAGE_PIXELS} pixels")
+            dpi = frame.info.get('dpi')
+            yield normalize_page(np.asarray(frame.convert('L')), dpi=float(dpi[0]) if dpi and dpi[0] else None)
+
+
+def _iter_pdf(stream, source):
+    try:
+        import fitz
+    except ImportError:
+        raise PageError(f"PDF support needs PyMuPDF installed, cannot read {source}")
+
+    # Uploads are spooled to a named file and opened from there; PDFs inside
+    # a ZIP are already in memory, bounded by MAX_IMAGE_BYTES.
+    path = getattr(stream, 'name', None)
+    document = fitz.open(path) if isinstance(path, str) else fitz.open(stream=stream.read(), filetype='pdf')
+    with document:
+        for page in document:
+            # Rendered no larger than PAGE_MAX_SIDE, which normalize_page would
+            # shrink it to anyway, so one oversized page cannot allocate more.
+            dpi = min(PDF_DPI, PAGE_MAX_SIDE * 72 / max(page.rect.width, page.rect.height, 1))
+            if page.rect.width * page.rect.height * (dpi / 72) ** 2 > MAX_IMAGE_PIXELS:
+                raise PageTooLarge(f"A page of {source} has more than {MAX_IMAGE_PIXELS} pixels")
+            pixmap = page.get_pixmap(dpi=max(int(dpi), 1), colorspace=fitz.csGRAY, alpha=False)
+            gray = np.frombuffer(pixmap.samples, np.uint8).reshape(pixmap.height, pixmap.stride)[:, :pixmap.width]
+            yield normalize_page(gray, dpi=max(int(dpi), 1))
+
+
+def _iter_document(name, stream):
+    lower = name.lower()
+    if lower.endswith(TIFF_EXTENSIONS):
+        for k, img in enumerate(_iter_tiff(stream, name)):
+            yield f"{name}#{k + 1}", img
+    elif lower.endswith('.pdf'):
+        for k, img in enumerate(_iter_pdf(stream, name)):
+            yield f"{name}#{k + 1}", img
+    elif lower.endswith('.zip'):
+        with zipfile.ZipFile(stream) as archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+                member_name = f"{name}/{member.filename}"
+                if member.file_size > MAX_IMAGE_BYTES:
+                    # Checked before extracting, so a compressed bomb is never inflated.
+                    yield member_name, PageTooLarge(f"{member_name} is larger than {MAX_IMAGE_BYTES} bytes")
+                    continue
+                with archive.open(member) as member_stream:
+                    # Members are read one by one; a seekable copy is needed
+                    # for TIFF and ZIP readers.
+                    data = io.BytesIO(member_stream.read())
+                try:
+                    yield from _iter_document(member_name, data)
+                except PageError as e:
+                    # One unreadable member should not drop the rest of the archive.
+                    yield member_name, e
+    else:
+        # One byte over the limit is enough to refuse the upload.
+        yield name, decode_page(stream.read(MAX_IMAGE_BYTES + 1), name)
+
+
+def spool_uploads(files):
+    # The request's own file handles are closed once the view returns, before
+    # a streamed response is consumed, so each upload is copied to a spool we own.
+    spooled = []
+    for file in files:
+        if (file.filename or '').lower().endswith('.pdf'):
+            # PyMuPDF reads a PDF from a path without loading all of it.
+            spool = tempfile.NamedTemporaryFile(suffix='.pdf')
+        else:
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        shutil.copyfileobj(file.stream, spool)
+        spool.seek(0)
+        spooled.append((file.filename or 'upload', spool))
+    return spooled
+
+
+def iter_pages(uploads):
+    """Lazily yields (source, image) for every page in the spooled uploads.
+
+    A source that cannot be read yields (source, PageError) instead so the
+    remaining pages are still processed.
+    """
+    for name, stream in uploads:
+        try:
+            pages = _iter_document(name, stream)
+            while True:
+                # Pages are decoded as the generator advances, so the time
+                # to produce each one is its decode time.
+                start = time.perf_counter()
+                try:
+                    source, img = next(pages)
+                except StopIteration:
+                    break
+                if not isinstance(img, Exception):
+                    observe_stage('decode', time.perf_counter() - start)
+                yield source, img
+        except PageError as e:
+            yield name, e
+        except Exception as e:
+            print(f"Error reading {name}: {e}")
+            yield name, PageError(f"Could not read {name}")
+        finally:
+            stream.close()
+
+
+def stream_pages(pool, pages, cache=None):
+    """Runs pages through the OCR pool and yields one NDJSON line per page as
+    soon as it finishes, followed by a summary line."""
+    done = queue.Queue()
+    window = max(1, pool.processes * PAGES_IN_FLIGHT_PER_WORKER)
+    in_flight = 0
+    page_count = 0
+    failed = 0
+    start = time.perf_counter()
+    pages = iter(pages)
+    exhausted = False
+
+    def result_line(page, source, rows_json=None, error=None):
+        line = {"page": page, "source": source}
+        if error is None and rows_json:
+            line["status"] = "done"
+            line["rows"] = json.loads(rows_json)
+        else:
+            line["status"] = "failed"
+            line["error"] = error or "No text found in the image"
+        return json.dumps(line) + "\n"
+
+    while True:
+        while not exhausted and in_flight < window:
+            try:
+                source, img = next(pages)
+            except StopIteration:
+                exhausted = True
+                break
+            page_count += 1
+            page = page_count
+            if isinstance(img, Exception):
+                failed += 1
+                yield result_line(page, source, error=str(img))
+                continue
+            cache_key = cache.key(img, variant='records') if cache else None
+            cached_json = cache.get(cache_key) if cache else None
+            if cached_json is not None:
+                yield result_line(page, source, cached_json)
+                continue
+
+            def on_done(rows_json, page=page, source=source, cache_key=cache_key):
+                if cache is not None:
+                    cache.put(cache_key, rows_json)
+                done.put((page, source, rows_json, None))
+
+            pool.submit(
+                img,
+                orient='records',
+                callback=on_done,
+                error_callback=lambda e, page=page, source=source: done.put((page, source, None, e)),
+            )
+            # Only the pool's pending task keeps the page alive from here on.
+            del img
+            in_flight += 1
+
+        if in_flight == 0:
+            break
+
+        page, source, rows_json, error = done.get()
+        in_flight -= 1
+        if error is not None:
+            print(f"Error processing page {page} ({source}): {error}")
+            error = "An error occurred while processing the image"
+        if error is not None or not rows_json:
+            failed += 1
+        yield result_line(page, source, rows_json, error)
+
+    yield json.dumps({"summary": {
+        "pages": page_count,
+        "failed": failed,
+        "seconds": round(time.perf_counter() - start, 3),
+    }}) + "\n"
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class OCRResultCache:
+    """Two-tier cache of table JSON keyed by the decoded image and OCR settings.
+
+    The memory tier is an LRU bounded by the total size of the stored JSON;
+    the disk tier keeps one file per key so results survive restarts.
+    """
+
+    def __init__(self, config_fingerprint, max_memory_bytes=None, cache_dir=None, max_disk_bytes=None):
+        self.config_fingerprint = config_fingerprint
+        self.max_memory_bytes = max_memory_bytes or int(os.environ.get('OCR_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+        self.cache_dir = cache_dir if cache_dir is not None else os.environ.get('OCR_CACHE_DIR', '.ocr_cache')
+        self.max_disk_bytes = max_disk_bytes or int(os.environ.get('OCR_CACHE_DISK_BYTES', 1024 * 1024 * 1024))
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = self._scan_disk_bytes()
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.stores = 0
+
+    def key(self, img, variant=None):
+        # variant distinguishes output formats of the same table (orient, typed columns).
+        digest = hashlib.sha256()
+        digest.update(f"{img.shape}|{img.dtype}|{self.config_fingerprint}|{variant}".encode())
+        digest.update(np.ascontiguousarray(img))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return value
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits_disk += 1
+            self._put_memory(key, value)
+        return value
+
+    def put(self, key, value):
+        if not value:
+            return
+        with self._lock:
+            self._put_memory(key, value)
+            self.stores += 1
+        self._write_disk(key, value)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+            }
+
+    def _put_memory(self, key, value):
+        # Called with the lock held.
+        size = len(value)
+        if size > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = value
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = f.read()
+            # Touch the entry so disk pruning drops least recently used ones first.
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"Error reading OCR cache entry {key}: {e}")
+            return None
+
+    def _write_disk(self, key, value):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry.
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(value)
+            size = os.path.getsize(tmp_path)
+            # Rewriting an entry replaces its old file rather than adding to it.
+            try:
+                size -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing OCR cache entry {key}: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += size
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._prune_disk()
+
+    def _disk_entries(self):
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_disk_bytes(self):
+        return sum(size for _, size, _ in self._disk_entries())
+
+    def _prune_disk(self):
+        # Drop the oldest entries until the disk tier is back to 90% of budget.
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
@@ -0,0 +1,124 @@
+import io
+import os
+
+import cv2
+import numpy as np
+
+# Every uploaded page becomes one grayscale image of bounded size before it
+# reaches the cache or the workers: the pipeline only ever reads gray pixels,
+# and a 12 MP phone photo decoded in colour is 36 MB per copy.
+MAX_IMAGE_BYTES = int(os.environ.get('OCR_MAX_IMAGE_BYTES', 25 * 1024 * 1024))
+# Checked from the file header, before any pixels are decoded.
+MAX_IMAGE_PIXELS = int(os.environ.get('OCR_MAX_IMAGE_PIXELS', 100_000_000))
+# Pages are scaled down to this resolution; photos carry no real DPI, so they
+# are taken to be an A4 sheet filling the frame.
+TARGET_DPI = int(os.environ.get('OCR_TARGET_DPI', 200))
+PAGE_LONG_INCHES = 11.7
+# Longest side of a normalized page, whatever the source resolution. The
+# pipeline holds about five page-sized 8-bit buffers at once, so this bounds
+# a worker's memory per page at roughly 5 x PAGE_MAX_SIDE^2 bytes.
+PAGE_MAX_SIDE = int(os.environ.get('OCR_PAGE_MAX_SIDE', round(TARGET_DPI * PAGE_LONG_INCHES)))
+# Rotations within this many degrees are corrected (0 disables deskewing).
+DESKEW_MAX_ANGLE = float(os.environ.get('OCR_DESKEW_MAX_ANGLE', 8))
+DESKEW_MIN_ANGLE = 0.2
+DESKEW_SIDE = 800
+DESKEW_LINES = 20
+# Resolutions below this are the 72/96 DPI placeholders cameras write.
+MIN_TRUSTED_DPI = 100
+
+# libjpeg scales by 1/2, 1/4 and 1/8 while decoding, so only the reduced
+# image is ever allocated; other formats are decoded and then resized.
+REDUCED_GRAYSCALE = {8: cv2.IMREAD_REDUCED_GRAYSCALE_8, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                     2: cv2.IMREAD_REDUCED_GRAYSCALE_2}
+
+
+class PageError(Exception):
+    status = 400
+
+
+class PageTooLarge(PageError):
+    status = 413
+
+
+def probe(data, source):
+    """(width, height, dpi or None) from the image header, or None when
+    Pillow cannot read it. Only the header is parsed."""
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as header:
+            width, height = header.size
+            dpi = header.info.get('dpi')
+    except Image.DecompressionBombError:
+        raise PageTooLarge(f"{source} has more than {MAX_IMAGE_PIXELS} pixels")
+    except Exception:
+        return None
+    dpi = float(dpi[0]) if dpi and dpi[0] else None
+    return width, height, dpi if dpi and dpi >= MIN_TRUSTED_DPI else None
+
+
+def target_scale(width, height, dpi=None):
+    """How much to shrink a page to TARGET_DPI and PAGE_MAX_SIDE; never above 1."""
+    scale = PAGE_MAX_SIDE / max(width, height, 1)
+    if dpi:
+        scale = min(scale, TARGET_DPI / dpi)
+    return min(scale, 1.0)
+
+
+def decode_page(data, source):
+    """Decodes an uploaded image into a normalized grayscale page."""
+    if len(data) > MAX_IMAGE_BYTES:
+        raise PageTooLarge(f"{source} is larger than {MAX_IMAGE_BYTES} bytes")
+    header = probe(data, source)
+    flag, scale = cv2.IMREAD_GRAYSCALE, None
+    if header is not None:
+        width, height, dpi = header
+        if width * height > MAX_IMAGE_PIXELS:
+            raise PageTooLarge(f"{source} has more than {MAX_IMAGE_PIXELS} pixels")
+        scale = target_scale(width, height, dpi)
+        for factor, reduced in REDUCED_GRAYSCALE.items():
+            if scale * factor <= 1:
+                flag, scale = reduced, scale * factor
+                break
+
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if gray is None:
+        raise PageError(f"Could not decode image {source}")
+    if scale is None:
+        scale = target_scale(gray.shape[1], gray.shape[0])
+    return normalize_page(gray, scale)
+
+
+def normalize_page(gray, scale=None, dpi=None):
+    """Scales a decoded grayscale page to the target resolution and deskews it."""
+    if scale is None:
+        scale = target_scale(gray.shape[1], gray.shape[0], dpi)
+    if scale < 0.95:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return deskew(gray)
+
+
+def skew_angle(gray):
+    """Angle in degrees of the strongest nearly horizontal lines (the table
+    rulings), measured on a small copy; None when there are none."""
+    shrink = min(1.0, DESKEW_SIDE / max(gray.shape))
+    small = cv2.resize(gray, None, fx=shrink, fy=shrink, interpolation=cv2.INTER_AREA) if shrink < 1 else gray
+    binary = cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 15, 10)
+    # Only normals within DESKEW_MAX_ANGLE of vertical are voted on, which
+    # keeps the transform cheap; a line at theta is tilted theta - 90 degrees.
+    lines = cv2.HoughLines(binary, 1, np.pi / 1800, threshold=small.shape[1] // 3,
+                           min_theta=np.radians(90 - DESKEW_MAX_ANGLE), max_theta=np.radians(90 + DESKEW_MAX_ANGLE))
+    if lines is None:
+        return None
+    return float(np.median(np.degrees(lines[:DESKEW_LINES, 0, 1]))) - 90
+
+
+def deskew(gray):
+    if DESKEW_MAX_ANGLE <= 0:
+        return gray
+    angle = skew_angle(gray)
+    if angle is None or abs(angle) < DESKEW_MIN_ANGLE:
+        return gray
+    height, width = gray.shape
+    rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(gray, rotation, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
@@ -0,0 +1,175 @@
+import csv
+import datetime
+import io
+import json
+import os
+import threading
+import urllib.request
+
+from ocr_metrics import INGESTED_ROWS
+
+# Writes OCR tables straight into the Auth-Service's transactions table, so
+# the browser does not have to send the rows back through /api/transactions/store.
+# Off unless a database is configured.
+INGEST_DATABASE_URL = os.environ.get('OCR_INGEST_DATABASE_URL')
+INGEST_BATCH_ROWS = int(os.environ.get('OCR_INGEST_BATCH_ROWS', 5000))
+INGEST_DB_CONNECTIONS = int(os.environ.get('OCR_INGEST_DB_CONNECTIONS', 4))
+JWT_SECRET = os.environ.get('JWT_SECRET')
+# The Analytics service is told about new rows the way the Auth-Service does it.
+ANALYTICS_URL = os.environ.get('ANALYTICS_URL')
+INTERNAL_API_TOKEN = os.environ.get('INTERNAL_API_TOKEN')
+
+# OCR table columns and the transactions columns they are stored in.
+COLUMNS = (('OrderID', 'orderID'), ('Item', 'item'), ('Quantity', 'quantity'), ('Selling Price', 'sellingPrice'))
+
+# Kept per connection and emptied at every commit.
+STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS ocr_ingest_rows (
+        "orderID" varchar(255), item varchar(255), quantity varchar(255), "sellingPrice" varchar(255)
+    ) ON COMMIT DELETE ROWS
+"""
+COPY_SQL = 'COPY ocr_ingest_rows ("orderID", item, quantity, "sellingPrice") FROM STDIN WITH (FORMAT csv)'
+# The unique index on (UserId, orderID, item, date) makes a retried upload a no-op.
+INSERT_SQL = """
+    INSERT INTO transactions ("UserId", date, "orderID", item, quantity, "sellingPrice", "createdAt", "updatedAt")
+    SELECT %(user_id)s, %(date)s, "orderID", item, quantity, "sellingPrice", now(), now()
+    FROM ocr_ingest_rows
+    ON CONFLICT ("UserId", "orderID", item, date) DO NOTHING
+    RETURNING id
+"""
+
+
+class IngestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def ingest_enabled():
+    return bool(INGEST_DATABASE_URL)
+
+
+def authenticated_user_id(request):
+    """User id from the Auth-Service JWT: the 'jwt' cookie or a Bearer header."""
+    import jwt
+
+    token = request.cookies.get('jwt')
+    authorization = request.headers.get('Authorization', '')
+    if not token and authorization.startswith('Bearer'):
+        token = authorization.split(' ', 1)[-1].strip()
+    if not token:
+        raise IngestError("Not logged in. Please login to get access.", 401)
+    if not JWT_SECRET:
+        print("JWT_SECRET is not defined. Cannot verify token.")
+        raise IngestError("Authentication is not configured", 500)
+    try:
+        return int(jwt.decode(token, JWT_SECRET, algorithms=['HS256'])['id'])
+    except (jwt.InvalidTokenError, KeyError, TypeError, ValueError) as e:
+        print(f"JWT Verification Error: {e}")
+        raise IngestError("Invalid token. Please login again.", 401)
+
+
+def sale_date(value):
+    # Stored as text like the rows from /api/transactions/store, but checked here.
+    try:
+        return datetime.date.fromisoformat((value or '').strip()).isoformat()
+    except ValueError:
+        raise IngestError("A 'date' (YYYY-MM-DD) is required")
+
+
+def table_rows(table):
+    """Turns an OCR table (the column -> {row: value} JSON of /ocr) into
+    (orderID, item, quantity, sellingPrice) tuples; returns (rows, skipped)
+    where skipped counts rows with an empty field."""
+    if isinstance(table, str):
+        table = json.loads(table)
+    missing = [name for name, _ in COLUMNS if name not in (table or {})]
+    if missing:
+        raise IngestError(f"OCR table has no {', '.join(missing)} column")
+
+    columns = [table[name] for name, _ in COLUMNS]
+    rows, skipped = [], 0
+    for key in columns[0]:
+        values = [column.get(key) for column in columns]
+        values = [str(value).strip() if value is not None else '' for value in values]
+        if all(values):
+            rows.append(tuple(value[:255] for value in values))
+        else:
+            skipped += 1
+    return rows, skipped
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _connection_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from psycopg2.pool import ThreadedConnectionPool
+            _pool = ThreadedConnectionPool(1, INGEST_DB_CONNECTIONS, INGEST_DATABASE_URL)
+        return _pool
+
+
+def store_rows(user_id, date, rows):
+    """Inserts the rows for the user in batches of INGEST_BATCH_ROWS through
+    COPY into a staging table, all in one transaction. Returns the ids of the
+    rows that were new."""
+    pool = _connection_pool()
+    conn = pool.getconn()
+    ids = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute(STAGING_SQL)
+            for start in range(0, len(rows), INGEST_BATCH_ROWS):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows[start:start + INGEST_BATCH_ROWS])
+                buffer.seek(0)
+                cur.copy_expert(COPY_SQL, buffer)
+                cur.execute(INSERT_SQL, {'user_id': user_id, 'date': date})
+                ids.extend(row[0] for row in cur.fetchall())
+                cur.execute('TRUNCATE ocr_ingest_rows')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+    return ids
+
+
+def ingest_table(user_id, date, table):
+    rows, skipped = table_rows(table)
+    ids = store_rows(user_id, date, rows) if rows else []
+    INGESTED_ROWS.labels('inserted').inc(len(ids))
+    INGESTED_ROWS.labels('duplicate').inc(len(rows) - len(ids))
+    INGESTED_ROWS.labels('skipped').inc(skipped)
+    if ids:
+        notify_transactions_stored([user_id])
+    return {
+        "received": len(rows) + skipped,
+        "inserted": len(ids),
+        "duplicates": len(rows) - len(ids),
+        "skipped": skipped,
+        "ids": ids,
+    }
+
+
+def _post_transactions_stored(user_ids):
+    request = urllib.request.Request(
+        f"{ANALYTICS_URL.rstrip('/')}/internal/transactions-stored",
+        data=json.dumps({"userIds": user_ids}).encode(),
+        headers={'Content-Type': 'application/json', **({'X-Internal-Token': INTERNAL_API_TOKEN} if INTERNAL_API_TOKEN else {})},
+        method='POST',
+    )
+    try:
+        urllib.request.urlopen(request, timeout=5).close()
+    except Exception as e:
+        print(f"Could not notify the Analytics service: {e}")
+
+
+def notify_transactions_stored(user_ids):
+    # Fire-and-forget, like analyticsNotify.ts: the rows are stored either way.
+    if ANALYTICS_URL:
+        threading.Thread(target=_post_transactions_stored, args=(user_ids,), daemon=True).start()
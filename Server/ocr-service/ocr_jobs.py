@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class OCRJobManager:
+    def __init__(self, pool, cache=None, max_pending=None, ttl=None):
+        self.pool = pool
+        self.cache = cache
+        # Jobs waiting for or running on a worker; beyond this, submissions are
+        # rejected instead of piling up behind the pool.
+        self.max_pending = max_pending or int(os.environ.get('OCR_MAX_PENDING_JOBS', 4 * pool.processes))
+        # Finished jobs are kept this many seconds so clients can poll the result.
+        self.ttl = ttl or float(os.environ.get('OCR_JOB_TTL', 600))
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        pool.set_progress_listener(self._on_progress)
+
+    def pending(self):
+        return self._pending
+
+    def submit(self, img, filename=None):
+        cache_key = self.cache.key(img) if self.cache else None
+        cached_json = self.cache.get(cache_key) if self.cache else None
+
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"OCR queue is full ({self._pending} jobs pending)")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "filename": filename,
+                "status": "queued",
+                "progress": {"rows_done": 0, "rows_total": None},
+                "created_at": time.time(),
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self._pending += 1
+
+        if cached_json is not None:
+            self._on_done(job_id, cached_json)
+            return job_id
+
+        try:
+            self.pool.submit(
+                img,
+                job_id=job_id,
+                callback=lambda result_json: self._on_done(job_id, result_json, cache_key),
+                error_callback=lambda e: self._on_error(job_id, e),
+            )
+        except Exception:
+            # Release the slot, or a pool that cannot take work fills the queue for good.
+            self._finish(job_id, "failed", error="An error occurred while submitting the image")
+            raise
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job, "progress": dict(job["progress"])}
+
+    def _on_progress(self, job_id, rows_done, rows_total):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in ("done", "failed"):
+                return
+            job["status"] = "running"
+            job["progress"]["rows_done"] = rows_done
+            if rows_total is not None:
+                job["progress"]["rows_total"] = rows_total
+
+    def _on_done(self, job_id, result_json, cache_key=None):
+        if cache_key is not None:
+            self.cache.put(cache_key, result_json)
+        if result_json is None or result_json == '{}' or len(result_json) == 0:
+            self._finish(job_id, "failed", error="No text found in the image")
+        else:
+            self._finish(job_id, "done", result=json.loads(result_json))
+
+    def _on_error(self, job_id, e):
+        print(f"Error processing OCR job {job_id}: {e}")
+        self._finish(job_id, "failed", error="An error occurred while processing the image")
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["status"] = status
+            job["result"] = result
+            job["error"] = error
+            job["finished_at"] = time.time()
+            self._pending -= 1
+
+    def _prune(self):
+        # Called with the lock held; expiry is checked lazily on access.
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] is not None and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,37 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# From a few milliseconds (decoding, cleaning) up to minutes (a large page on
+# a busy worker).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    'ocr_stage_seconds', 'Time spent in each OCR pipeline stage per page',
+    ['stage'], buckets=LATENCY_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    'ocr_queue_wait_seconds', 'Time a page waited for a free OCR worker',
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    'ocr_http_request_seconds', 'HTTP request latency, including streamed responses',
+    ['method', 'endpoint', 'status'], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge('ocr_http_requests_in_flight', 'HTTP requests currently being served')
+POOL_TASKS = Gauge('ocr_pool_tasks', 'Pages submitted to the OCR worker pool that have not finished')
+JOBS_PENDING = Gauge('ocr_jobs_pending', 'Async OCR jobs queued or running')
+WORKERS_LOADED = Gauge('ocr_workers_loaded', 'OCR workers with a loaded engine')
+WORKER_MAX_RSS = Gauge('ocr_worker_max_rss_bytes', 'Highest peak resident memory reported by an OCR worker')
+INGESTED_ROWS = Counter('ocr_ingested_rows', 'OCR table rows sent to /ocr/ingest', ['result'])
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def observe_stages(timings):
+    for stage, seconds in timings.items():
+        observe_stage(stage, seconds)
+
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
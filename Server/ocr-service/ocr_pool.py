@@ -0,0 +1,175 @@
+import functools
+import multiprocessing as mp
+import os
+import resource
+import threading
+import time
+
+from ocr_metrics import POOL_TASKS, QUEUE_WAIT_SECONDS, WORKER_MAX_RSS, observe_stages
+
+# Each worker process keeps its own PaddleOCR instance for its whole lifetime,
+# so the models are loaded once at startup instead of once per request.
+_worker_engine = None
+_progress_queue = None
+
+
+def _init_worker(ready_counter, progress_queue, profiling_flag, cpu_threads):
+    global _worker_engine, _progress_queue
+    from table_log import config_ocr_engine
+    from profiler import watch_profiling_flag
+
+    _progress_queue = progress_queue
+    watch_profiling_flag(profiling_flag, f"ocr-worker-{os.getpid()}")
+
+    _worker_engine = config_ocr_engine(cpu_threads=cpu_threads)
+    if _worker_engine is not None:
+        with ready_counter.get_lock():
+            ready_counter.value += 1
+
+
+def _report_progress(job_id, rows_done, rows_total):
+    _progress_queue.put((job_id, rows_done, rows_total))
+
+
+def _run_table_log(img, job_id=None, orient=None, typed=False, submitted_at=None):
+    # Returns (table JSON, stage timings); the pool records the timings in the
+    # parent process and hands only the JSON to callers.
+    from table_log import result_table_log, typed_table_data
+
+    timings = {}
+    if submitted_at is not None:
+        timings['queue'] = max(0.0, time.time() - submitted_at)
+    if _worker_engine is None:
+        raise RuntimeError("OCR engine is not available in this worker")
+
+    progress = None
+    if job_id is not None:
+        progress = functools.partial(_report_progress, job_id)
+        # Tells the parent the job has left the queue and started running.
+        progress(0, None)
+
+    ocr_result = result_table_log(img, _worker_engine, progress=progress, timings=timings)
+    if ocr_result is None:
+        return None, timings
+    start = time.perf_counter()
+    if typed:
+        ocr_result = typed_table_data(ocr_result)
+    result_json = ocr_result.to_json(orient=orient)
+    timings['clean'] = timings.get('clean', 0.0) + time.perf_counter() - start
+    # Linux reports the peak in KiB.
+    timings['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result_json, timings
+
+
+class OCRWorkerPool:
+    def __init__(self, processes=None, cpu_threads=None):
+        self.processes = processes or int(os.environ.get('OCR_WORKERS', os.cpu_count() or 1))
+        # PaddleOCR spawns its own math threads; keep them low so that N workers
+        # on N cores do not oversubscribe the CPU.
+        self.cpu_threads = cpu_threads or int(os.environ.get('OCR_CPU_THREADS', 1))
+        # Replaces a worker after this many pages, returning memory its
+        # allocator kept; each replacement reloads the models (off by default).
+        self.max_tasks = int(os.environ.get('OCR_WORKER_MAX_TASKS', 0)) or None
+        self._max_rss = 0
+        # PaddlePaddle is not fork-safe, so workers always start from a clean interpreter.
+        self._ctx = mp.get_context('spawn')
+        # Shared state is created in start(), so importing this module (which
+        # every spawned worker does) stays cheap.
+        self._ready_counter = None
+        self._progress_queue = None
+        # Set while workers should run the sampling profiler.
+        self._profiling_flag = None
+        self._progress_listener = None
+        self._progress_thread = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def set_progress_listener(self, listener):
+        # listener(job_id, rows_done, rows_total) is called from a background
+        # thread in this process for every progress message a worker sends.
+        self._progress_listener = listener
+
+    def _drain_progress(self):
+        while True:
+            message = self._progress_queue.get()
+            if message is None:
+                break
+            if self._progress_listener is not None:
+                try:
+                    self._progress_listener(*message)
+                except Exception as e:
+                    print(f"Error handling OCR progress {message}: {e}")
+
+    def start(self):
+        with self._lock:
+            if self._pool is None:
+                print(f"Starting {self.processes} OCR worker(s)...")
+                self._ready_counter = self._ctx.Value('i', 0)
+                self._progress_queue = self._ctx.Queue()
+                self._profiling_flag = self._ctx.Value('b', 0)
+                self._pool = self._ctx.Pool(
+                    processes=self.processes,
+                    initializer=_init_worker,
+                    initargs=(self._ready_counter, self._progress_queue, self._profiling_flag, self.cpu_threads),
+                    maxtasksperchild=self.max_tasks,
+                )
+                self._progress_thread = threading.Thread(target=self._drain_progress, daemon=True)
+                self._progress_thread.start()
+        return self
+
+    def loaded_workers(self):
+        if self._ready_counter is None:
+            return 0
+        return min(self._ready_counter.value, self.processes)
+
+    def is_ready(self):
+        return self._pool is not None and self.loaded_workers() >= self.processes
+
+    def set_profiling(self, enabled):
+        # Workers notice the change within their polling interval.
+        self.start()
+        self._profiling_flag.value = 1 if enabled else 0
+
+    def submit(self, img, job_id=None, orient=None, typed=False, callback=None, error_callback=None):
+        # Tasks go through the pool's shared queue, so whichever worker is idle
+        # picks up the next image.
+        self.start()
+        POOL_TASKS.inc()
+
+        def on_done(result):
+            POOL_TASKS.dec()
+            result_json, timings = result
+            queue_wait = timings.pop('queue', None)
+            if queue_wait is not None:
+                QUEUE_WAIT_SECONDS.observe(queue_wait)
+            max_rss = timings.pop('max_rss', None)
+            if max_rss is not None and max_rss > self._max_rss:
+                self._max_rss = max_rss
+                WORKER_MAX_RSS.set(max_rss)
+            observe_stages(timings)
+            if callback is not None:
+                callback(result_json)
+
+        def on_error(e):
+            POOL_TASKS.dec()
+            if error_callback is not None:
+                error_callback(e)
+
+        return self._pool.apply_async(
+            _run_table_log, (img, job_id, orient, typed, time.time()),
+            callback=on_done, error_callback=on_error,
+        )
+
+    def run(self, img, typed=False, timeout=None):
+        result_json, _ = self.submit(img, typed=typed).get(timeout)
+        return result_json
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+                self._progress_queue.put(None)
+                self._progress_thread.join()
+                self._progress_thread = None
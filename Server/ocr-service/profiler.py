@@ -0,0 +1,119 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_INTERVAL = float(os.environ.get('OCR_PROFILE_INTERVAL', 0.005))
+PROFILE_DIR = os.environ.get('OCR_PROFILE_DIR', 'profiles')
+
+
+class SamplingProfiler:
+    """Statistical profiler that periodically samples the Python stacks of
+    threads in this process.
+
+    Nothing runs while it is stopped, so it can stay wired in and be switched
+    on under real load. Stacks are aggregated in the collapsed format read by
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=None, main_thread_only=False):
+        self.interval = interval or PROFILE_INTERVAL
+        self.main_thread_only = main_thread_only
+        self.samples = 0
+        self.started_at = None
+        self._stacks = Counter()
+        # Held by the sampler while it adds stacks, so readers can copy them.
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self.running():
+            return False
+        self._stacks = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if not self.running():
+            return False
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return True
+
+    def _sample(self):
+        own = threading.get_ident()
+        main = threading.main_thread().ident
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (self.main_thread_only and thread_id != main):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                with self._lock:
+                    self._stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def _snapshot(self):
+        # The sampler keeps adding stacks while a profile is read mid-run.
+        with self._lock:
+            return self._stacks.copy()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self._snapshot().most_common())
+
+    def top(self, limit=20):
+        # Self samples count the function at the top of the stack, total
+        # samples every stack the function appears in.
+        own = Counter()
+        total = Counter()
+        for stack, count in self._snapshot().items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return [
+            {"function": name, "self": count, "total": total[name]}
+            for name, count in own.most_common(limit)
+        ]
+
+    def write(self, name):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{name}.folded")
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
+        return path
+
+
+def watch_profiling_flag(flag, name, poll_interval=0.5):
+    """Profiles this process's main thread whenever the shared flag is set
+    and writes the stacks to PROFILE_DIR when it is cleared again.
+
+    Used in the OCR workers, which have no HTTP endpoint of their own.
+    """
+    def watch():
+        profiler = SamplingProfiler(main_thread_only=True)
+        while True:
+            time.sleep(poll_interval)
+            if flag.value and not profiler.running():
+                profiler.start()
+            elif not flag.value and profiler.running():
+                profiler.stop()
+                try:
+                    profiler.write(name)
+                except OSError as e:
+                    print(f"Error writing profile {name}: {e}")
+
+    threading.Thread(target=watch, daemon=True).start()
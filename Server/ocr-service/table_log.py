@@ -2,14 +2,19 @@ import os
 import numpy as np
 import pandas as pd
 import re
-import matplotlib.pyplot as plt
+import time
 import cv2
-from paddleocr import PaddleOCR
 
-def config_ocr_engine():
+def config_ocr_engine(cpu_threads=None):
     try:
+        # Imported here so that processes which never run OCR (e.g. the web
+        # front of the worker pool) do not pay for loading paddle.
+        from paddleocr import PaddleOCR
         print("Initializing PaddleOCR...")
-        ocr_engine = PaddleOCR(use_angle_cls=True, lang="en", use_gpu=False, show_log=False)
+        options = {}
+        if cpu_threads:
+            options['cpu_threads'] = cpu_threads
+        ocr_engine = PaddleOCR(use_angle_cls=True, lang="en", use_gpu=False, show_log=False, **options)
         print("PaddleOCR initialized successfully.")
         return ocr_engine
     except Exception as e:
@@ -18,150 +23,423 @@ def config_ocr_engine():
         return None
     
 def process_image(image):
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    # Uploads arrive already gray (see ocr_decode.py); colour is still accepted.
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 4)
     blurred = cv2.medianBlur(binary, 3)
     return gray, blurred
 
+# Grid lines are searched on a copy scaled down to at most this many pixels on
+# its long side; line coordinates are mapped back to full resolution.
+GRID_MAX_SIDE = int(os.environ.get('OCR_GRID_MAX_SIDE', 1600))
+# Lines closer than this (full-resolution pixels) are one ruling drawn thick
+# or broken, and are merged.
+GRID_MERGE_TOLERANCE = int(os.environ.get('OCR_GRID_MERGE_TOLERANCE', 12))
+# Cells whose interior has less ink than this fraction are left empty
+# without calling the OCR engine. Ink is a pixel clearly darker than the paper
+# around it, which ignores paper texture that the binarization keeps.
+MIN_INK_FRACTION = float(os.environ.get('OCR_MIN_INK_FRACTION', 0.01))
+INK_CONTRAST = int(os.environ.get('OCR_INK_CONTRAST', 25))
+INK_CHECK_MARGIN = 4
+
+# 'batch' recognizes the same padded cell crops as 'cell' in a few batched
+# calls, so it reads the same table; 'cell' runs a full OCR pass per cell
+# (slowest, kept for comparison). 'page' detects text once on the whole page
+# and assigns boxes to grid cells by their centres: faster, but a box that
+# spans a ruling line lands whole in one cell, so its table can differ.
+RECOGNITION_MODES = ('page', 'batch', 'cell')
+RECOGNITION_MODE = os.environ.get('OCR_RECOGNITION_MODE', 'batch')
+REC_BATCH_SIZE = int(os.environ.get('OCR_REC_BATCH_SIZE', 64))
+# Recognition without detection always returns some text, so crops of empty
+# cells are dropped below this confidence.
+REC_MIN_SCORE = float(os.environ.get('OCR_REC_MIN_SCORE', 0.5))
+
+# Bump when a code change alters the table produced for the same image, so
+# cached results from older code are not served.
+PIPELINE_VERSION = 2
+
+def ocr_config_fingerprint():
+    # Everything that changes the extracted table for the same image; cached
+    # results are only reused while these settings stay the same.
+    return (f"paddleocr-en|pipeline={PIPELINE_VERSION}|mode={RECOGNITION_MODE}|min_score={REC_MIN_SCORE}"
+            f"|grid={GRID_MAX_SIDE},{GRID_MERGE_TOLERANCE}|ink={MIN_INK_FRACTION},{INK_CONTRAST}")
+
+def find_line_boxes(binary, kernel_size, min_length, horizontal):
+    if horizontal:
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_size, 1))
+    else:
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, kernel_size))
+    detected = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel, iterations=2)
+    cnts = cv2.findContours(detected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    cnts = cnts[0] if len(cnts) == 2 else cnts[1]
+    if not cnts:
+        return np.empty((0, 4), dtype=np.float64)
+    # Columns: x, y, w, h
+    boxes = np.array([cv2.boundingRect(c) for c in cnts], dtype=np.float64)
+    length = boxes[:, 2] if horizontal else boxes[:, 3]
+    return boxes[length > min_length]
+
+def merge_lines(position, start, end, thickness, tolerance):
+    # Sort by position and start a new cluster wherever the gap to the
+    # previous line exceeds the tolerance; each cluster becomes one line
+    # spanning the union of its members.
+    order = np.argsort(position, kind='stable')
+    position, start, end, thickness = position[order], start[order], end[order], thickness[order]
+    starts = np.flatnonzero(np.r_[True, np.diff(position) > tolerance])
+    counts = np.diff(np.r_[starts, len(position)])
+    return (
+        np.add.reduceat(position, starts) / counts,
+        np.minimum.reduceat(start, starts),
+        np.maximum.reduceat(end, starts),
+        np.maximum.reduceat(thickness, starts),
+    )
+
 def get_table_structure(blurred):
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
-    detect_horizontal = cv2.morphologyEx(blurred, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
-    cnts_h = cv2.findContours(detect_horizontal, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    cnts_h = cnts_h[0] if len(cnts_h) == 2 else cnts_h[1]
+    height, width = blurred.shape[:2]
+    scale = min(1.0, GRID_MAX_SIDE / max(height, width))
+    if scale < 1.0:
+        small = cv2.resize(blurred, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        # Area averaging turns thin lines grey; re-binarize generously so they survive.
+        _, small = cv2.threshold(small, 64, 255, cv2.THRESH_BINARY)
+    else:
+        small = blurred
+
+    # Same kernel and minimum line length as at full resolution, scaled down.
+    kernel_size = max(5, round(40 * scale))
+    min_length = 50 * scale
+    h_boxes = find_line_boxes(small, kernel_size, min_length, horizontal=True) / scale
+    v_boxes = find_line_boxes(small, kernel_size, min_length, horizontal=False) / scale
+
     horizontal_lines = []
-    for c in cnts_h:
-        x, y, w, h = cv2.boundingRect(c)
-        if w > 50:
-            horizontal_lines.append((x, y, x + w, h))
-
-    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 40))
-    detect_vertical = cv2.morphologyEx(blurred, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
-    cnts_v = cv2.findContours(detect_vertical, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    cnts_v = cnts_v[0] if len(cnts_v) == 2 else cnts_v[1]
-    vertical_lines = []
-    for c in cnts_v:
-        x, y, w, h = cv2.boundingRect(c)
-        if h > 50:
-            vertical_lines.append((x, y, x, y + h))
+    if len(h_boxes):
+        y, x1, x2, h = merge_lines(h_boxes[:, 1], h_boxes[:, 0], h_boxes[:, 0] + h_boxes[:, 2], h_boxes[:, 3], GRID_MERGE_TOLERANCE)
+        horizontal_lines = [(int(a), int(round(b)), int(c), int(round(d))) for a, b, c, d in zip(x1, y, x2, h)]
 
-    horizontal_lines.sort(key=lambda line:line[1])
-    vertical_lines.sort(key=lambda line:line[0])
+    vertical_lines = []
+    if len(v_boxes):
+        x, y1, y2, _ = merge_lines(v_boxes[:, 0], v_boxes[:, 1], v_boxes[:, 1] + v_boxes[:, 3], v_boxes[:, 2], GRID_MERGE_TOLERANCE)
+        vertical_lines = [(int(round(a)), int(b), int(round(a)), int(c)) for a, b, c in zip(x, y1, y2)]
 
     return horizontal_lines, vertical_lines
 
-def extract_table(ocr_engine, gray, horizontal_lines, vertical_lines):
+def skip_empty_cells(gray, regions):
+    # Ink per cell interior comes from one integral image, so the check costs
+    # four lookups per cell; empty cells become "" and never reach the OCR engine.
+    positions = [(i, j) for i, row in enumerate(regions) for j, roi in enumerate(row) if not isinstance(roi, str)]
+    if not positions:
+        return regions
+    ink_mask = cv2.adaptiveThreshold(gray, 1, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, INK_CONTRAST)
+    integral = cv2.integral(ink_mask)
+    rois = np.array([regions[i][j] for i, j in positions], dtype=np.int64)
+    y1 = np.minimum(rois[:, 0] + INK_CHECK_MARGIN, rois[:, 1])
+    y2 = np.maximum(rois[:, 1] - INK_CHECK_MARGIN, y1)
+    x1 = np.minimum(rois[:, 2] + INK_CHECK_MARGIN, rois[:, 3])
+    x2 = np.maximum(rois[:, 3] - INK_CHECK_MARGIN, x1)
+    ink = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+    area = np.maximum((y2 - y1) * (x2 - x1), 1)
+    empty = ink / area < MIN_INK_FRACTION
+
+    regions = [list(row) for row in regions]
+    for (i, j), is_empty in zip(positions, empty):
+        if is_empty:
+            regions[i][j] = ""
+    print(f"Skipping {int(empty.sum())} of {len(positions)} cells with no ink.")
+    return regions
+
+def get_cell_regions(gray, horizontal_lines, vertical_lines, cell_padding=3):
+    regions = []
+    for i in range(len(horizontal_lines) - 1):
+        row = []
+        y1 = horizontal_lines[i][1]
+        y2 = horizontal_lines[i+1][1]
+        for j in range(len(vertical_lines) - 1):
+            x1 = vertical_lines[j][0]
+            x2 = vertical_lines[j+1][0]
+            if y1 < y2 and x1 < x2:
+                roi_y1 = max(0, y1 + cell_padding)
+                roi_y2 = min(gray.shape[0], y2 - cell_padding)
+                roi_x1 = max(0, x1 + cell_padding)
+                roi_x2 = min(gray.shape[1], x2 - cell_padding)
+                if roi_y1 < roi_y2 and roi_x1 < roi_x2:
+                    row.append((roi_y1, roi_y2, roi_x1, roi_x2))
+                else:
+                    row.append("[Invalid ROI]")
+            else:
+                row.append("[Invalid Coords]")
+        regions.append(row)
+    return regions
+
+def crop_cell(gray, roi):
+    roi_y1, roi_y2, roi_x1, roi_x2 = roi
+    cell_image = gray[roi_y1:roi_y2, roi_x1:roi_x2]
+    return cv2.copyMakeBorder(cell_image, 5, 5, 5, 5, cv2.BORDER_CONSTANT, value=[255])
+
+def recognize_cells(ocr_engine, gray, regions, progress=None):
+    table_data = []
+    for i, row in enumerate(regions):
+        row_data = []
+        for j, roi in enumerate(row):
+            if isinstance(roi, str):
+                row_data.append(roi)
+                continue
+            cell_text = ""
+            try:
+                result = ocr_engine.ocr(crop_cell(gray, roi), cls=False)
+                if result and result[0]:
+                    texts = [line[1][0] for line in result[0] if line and len(line) > 1]
+                    cell_text = " ".join(texts).strip()
+                    cell_text = cell_text.replace('\n', ' ').replace('\r', ' ')
+            except Exception as e:
+                print(f"PaddleOCR for cell ({i}, {j}): {e}")
+                cell_text = "[OCR Error]"
+            row_data.append(cell_text)
+        table_data.append(row_data)
+        if progress:
+            progress(i + 1, len(regions))
+    return table_data
+
+def recognize_batched(ocr_engine, gray, regions, progress=None):
+    table_data = [[roi if isinstance(roi, str) else "" for roi in row] for row in regions]
+    positions = [(i, j) for i, row in enumerate(regions) for j, roi in enumerate(row) if not isinstance(roi, str)]
+
+    for start in range(0, len(positions), REC_BATCH_SIZE):
+        batch = positions[start:start + REC_BATCH_SIZE]
+        crops = [cv2.cvtColor(crop_cell(gray, regions[i][j]), cv2.COLOR_GRAY2BGR) for i, j in batch]
+        try:
+            # With det=False a list of images goes to the recognizer as one batch.
+            result = ocr_engine.ocr(crops, det=False, cls=False)
+            rec_res = result[0] if result else []
+            for (i, j), (text, score) in zip(batch, rec_res):
+                if score >= REC_MIN_SCORE:
+                    table_data[i][j] = text.replace('\n', ' ').replace('\r', ' ').strip()
+        except Exception as e:
+            print(f"PaddleOCR for cells {batch[0]}..{batch[-1]}: {e}")
+            for i, j in batch:
+                table_data[i][j] = "[OCR Error]"
+        if progress:
+            # Positions are in row order, so every row before the last one in
+            # this batch is finished.
+            last_row = batch[-1][0]
+            rows_done = last_row + 1 if start + REC_BATCH_SIZE >= len(positions) else last_row
+            progress(rows_done, len(regions))
+    return table_data
+
+def recognize_page(ocr_engine, gray, regions, horizontal_lines, vertical_lines, progress=None):
+    table_data = [[roi if isinstance(roi, str) else "" for roi in row] for row in regions]
+
+    # Only the padded cell interiors are kept, exactly what the per-cell path
+    # would see, so ruling lines are not picked up as text.
+    page = np.full_like(gray, 255)
+    for row in regions:
+        for roi in row:
+            if not isinstance(roi, str):
+                roi_y1, roi_y2, roi_x1, roi_x2 = roi
+                page[roi_y1:roi_y2, roi_x1:roi_x2] = gray[roi_y1:roi_y2, roi_x1:roi_x2]
+
+    try:
+        result = ocr_engine.ocr(page, cls=False)
+    except Exception as e:
+        print(f"PaddleOCR for page: {e}")
+        return [["[OCR Error]" if not isinstance(roi, str) else roi for roi in row] for row in regions]
+    del page
+
+    lines = [line for line in (result[0] if result and result[0] else []) if line and len(line) > 1]
+    if not lines:
+        return table_data
+
+    boxes = np.array([line[0] for line in lines], dtype=np.float32).reshape(-1, 4, 2)
+    centers = boxes.mean(axis=1)
+    line_ys = np.array([line[1] for line in horizontal_lines])
+    line_xs = np.array([line[0] for line in vertical_lines])
+    rows = np.searchsorted(line_ys, centers[:, 1], side='right') - 1
+    cols = np.searchsorted(line_xs, centers[:, 0], side='right') - 1
+
+    cell_texts = {}
+    # Reading order inside a cell: top to bottom, then left to right.
+    for k in np.lexsort((centers[:, 0], centers[:, 1])):
+        i, j = int(rows[k]), int(cols[k])
+        if 0 <= i < len(regions) and 0 <= j < len(regions[i]) and not isinstance(regions[i][j], str):
+            cell_texts.setdefault((i, j), []).append(lines[k][1][0])
+    for (i, j), texts in cell_texts.items():
+        table_data[i][j] = " ".join(texts).strip().replace('\n', ' ').replace('\r', ' ')
+    if progress:
+        # The whole page is recognized in one call, so rows finish together.
+        progress(len(regions), len(regions))
+    return table_data
+
+def extract_table(ocr_engine, gray, horizontal_lines, vertical_lines, mode=None, progress=None, skip_empty=True, clean=True, timings=None):
+    # timings, when given, collects the seconds spent in the 'ocr' and 'clean' stages.
     table_data = []
-    cell_padding = 3
+    start = time.perf_counter()
+    mode = mode or RECOGNITION_MODE
+    if mode not in RECOGNITION_MODES:
+        raise ValueError(f"Unknown recognition mode '{mode}', expected one of {RECOGNITION_MODES}")
 
     if not horizontal_lines or not vertical_lines or len(horizontal_lines) < 2 or len(vertical_lines) < 2:
         print(f"Warning: Could not detect enough horizontal lines or vertical lines to form a grid")
     else:
         print(f"Detected potential structure: {len(horizontal_lines) - 1} rows, {len(vertical_lines) - 1} columns.")
-        for i in range(len(horizontal_lines) - 1):
-            row_data = []
-            y1 = horizontal_lines[i][1]
-            y2 = horizontal_lines[i+1][1]
-            for j in range(len(vertical_lines) - 1):
-                x1 = vertical_lines[j][0]
-                x2 = vertical_lines[j+1][0]
-                # --- Cell Extraction ---
-                if y1 < y2 and x1 < x2:
-                    roi_y1 = max(0, y1 + cell_padding)
-                    roi_y2 = min(gray.shape[0], y2 - cell_padding)
-                    roi_x1 = max(0, x1 + cell_padding)
-                    roi_x2 = min(gray.shape[1], x2 - cell_padding)
-                    if roi_y1 < roi_y2 and roi_x1 < roi_x2:
-                        cell_image = gray[roi_y1:roi_y2, roi_x1:roi_x2]
-                        cell_image_bordered = cv2.copyMakeBorder(cell_image, 5, 5, 5, 5, cv2.BORDER_CONSTANT, value=[255])
-
-                        cell_text = ""
-                        try:
-                            result = ocr_engine.ocr(cell_image_bordered, cls=False)
-                            if result and result[0]:
-                                texts = [line[1][0] for line in result[0] if line and len(line) > 1]
-                                cell_text = " ".join(texts).strip()
-                                cell_text = cell_text.replace('\n', ' ').replace('\r', ' ')
-                        except Exception as e:
-                            print(f"PaddleOCR for cell ({i}, {j}): {e}")
-                            cell_text = "[OCR Error]"
-                        row_data.append(cell_text)
-                    else:
-                        row_data.append("[Invalid ROI]")
-                else:
-                    row_data.append("[Invalid Coords]")
+        regions = get_cell_regions(gray, horizontal_lines, vertical_lines)
+        if skip_empty:
+            regions = skip_empty_cells(gray, regions)
+        if mode == 'page':
+            table_data = recognize_page(ocr_engine, gray, regions, horizontal_lines, vertical_lines, progress)
+        elif mode == 'batch':
+            table_data = recognize_batched(ocr_engine, gray, regions, progress)
+        else:
+            table_data = recognize_cells(ocr_engine, gray, regions, progress)
+        table_data = [row_data for row_data in table_data if row_data]
+    if timings is not None:
+        timings['ocr'] = time.perf_counter() - start
 
-            if row_data:
-                table_data.append(row_data)
+    if not clean:
+        return table_data
+    start = time.perf_counter()
+    df = clean_table_data(table_data)
+    if timings is not None:
+        timings['clean'] = time.perf_counter() - start
+    return df
 
-    return clean_table_data(table_data)
+# Patterns for the cleaning stage, compiled once and applied column-wise.
+BRACKETED_RE = re.compile(r'^\[(.*)\]$', re.DOTALL)
+INVALID_RE = re.compile(r'Invalid', re.IGNORECASE)
+BLANK_RE = re.compile(r'^\s*$')
+STOPWORDS = ['', '-', '--']
+ORDER_ID_RE = re.compile(r'(\d+)')
+QUANTITY_RE = re.compile(r'^\s*(\d+(?:[.,]\d+)?)\s*([A-Za-z]*)')
+PRICE_RE = re.compile(r'(\d+(?:\.\d+)?)')
+# OCR spellings of the units shops write, mapped to the units the ledger uses.
+UNIT_ALIASES = {
+    'kg': 'kg', 'kgs': 'kg', 'kilo': 'kg', 'kilos': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'g': 'gm', 'gm': 'gm', 'gms': 'gm', 'gram': 'gm', 'grams': 'gm', 'gr': 'gm',
+    'l': 'L', 'lt': 'L', 'ltr': 'L', 'ltrs': 'L', 'litre': 'L', 'litres': 'L', 'liter': 'L', 'liters': 'L',
+    'ml': 'ml',
+    'pc': 'pcs', 'pcs': 'pcs', 'piece': 'pcs', 'pieces': 'pcs', 'nos': 'pcs', 'no': 'pcs',
+    'dozen': 'dozen', 'dz': 'dozen',
+}
 
-def clean_cell(x):
-    if isinstance(x, (list, tuple)) or hasattr(x, 'tolist'):
-        try:
-            x = x[0]
-        except Exception:
-            pass
-    s = str(x).strip()
-    if s.startswith('[') and s.endswith(']'):
-        s = s[1:-1].strip()
-    return s
-
-def is_stopword(s):
-    if not s:
-        return True
-    if s in {'-', '--'}:
-        return True
-    if re.search(r'Invalid', s, re.IGNORECASE):
-        return True
-    return False
+def clean_cells(df):
+    # One pass over every cell as a single string Series instead of a Python
+    # call per cell.
+    cells = pd.Series(df.to_numpy(dtype=object).ravel(), dtype=object)
+    cells = cells.map(lambda x: x[0] if isinstance(x, (list, tuple)) and x else x, na_action='ignore')
+    cells = cells.astype(str).str.strip()
+    cells = cells.str.replace(BRACKETED_RE, r'\1', regex=True).str.strip()
+    stopword = cells.isin(STOPWORDS) | cells.str.contains(INVALID_RE)
+
+    shape = df.shape
+    cleaned = pd.DataFrame(cells.to_numpy().reshape(shape), index=df.index, columns=df.columns)
+    mask = pd.DataFrame(stopword.to_numpy().reshape(shape), index=df.index, columns=df.columns)
+    return cleaned, mask
 
 def clean_table_data(table_data):
+    has_header = False
     if table_data:
         df = pd.DataFrame(table_data)
         try:
             if all(isinstance(x, str) and len(x) > 0 and not x.isnumeric() for x in df.iloc[0]):
-                df.columns = df.iloc[0]
+                df.columns = [x.strip() for x in df.iloc[0]]
                 df = df[1:]
                 df = df.reset_index(drop=True)
+                has_header = True
         except Exception:
             pass
     else:
         return pd.DataFrame()
-    
-    df_cleaned = df.applymap(clean_cell)
 
-    mask = df_cleaned.applymap(is_stopword)
+    df_cleaned, mask = clean_cells(df)
 
     keep_cols = ~mask.all(axis=0)
     df_cleaned = df_cleaned.loc[:, keep_cols]
-    
+    mask = mask.loc[:, keep_cols]
+
     keep_rows = ~mask.all(axis=1)
     df_cleaned = df_cleaned.loc[keep_rows, :]
 
     df_cleaned.reset_index(drop=True, inplace=True)
-    
-    df_header = df_cleaned.iloc[0]
-    df_res = df_cleaned[1:].copy()
-    df_res.columns = df_header
+
+    # When the first grid row was already taken as the header above, the
+    # next row is data and must not become a second header.
+    if has_header:
+        df_res = df_cleaned.copy()
+    else:
+        df_header = df_cleaned.iloc[0]
+        df_res = df_cleaned[1:].copy()
+        df_res.columns = df_header
     df_res = df_res.reset_index(drop=True)
 
-    df_res['OrderID'] = df_res['OrderID'].replace(r'^\s*$', np.nan, regex=True)
+    df_res['OrderID'] = df_res['OrderID'].replace(BLANK_RE, np.nan, regex=True)
     df_res['OrderID'] = df_res['OrderID'].ffill()
-    # df_res['OrderID'] = df_res['OrderID'].astype(int)
 
     return df_res
 
-def result_table_log(img):
-    ocr_engine = config_ocr_engine()
+def typed_table_data(df_res):
+    # Parsed columns next to the text ones, so ingestion and analytics do not
+    # have to re-parse strings like "0.5kg" or "Rs 1,200".
+    typed = df_res.copy()
+
+    if 'OrderID' in typed:
+        order_ids = typed['OrderID'].astype('string').str.extract(ORDER_ID_RE, expand=False)
+        typed['OrderID'] = pd.to_numeric(order_ids, errors='coerce').ffill().astype('Int64')
+
+    if 'Quantity' in typed:
+        parts = typed['Quantity'].astype('string').str.extract(QUANTITY_RE)
+        typed['QuantityValue'] = pd.to_numeric(parts[0].str.replace(',', '.', regex=False), errors='coerce').astype('Float64')
+        typed['Unit'] = parts[1].str.lower().map(UNIT_ALIASES).astype('string')
+
+    if 'Selling Price' in typed:
+        prices = typed['Selling Price'].astype('string').str.replace(',', '', regex=False).str.extract(PRICE_RE, expand=False)
+        typed['SellingPriceValue'] = pd.to_numeric(prices, errors='coerce').astype('Float64')
+
+    return typed
+
+def result_table_log(img, ocr_engine=None, progress=None, timings=None):
+    if ocr_engine is None:
+        ocr_engine = config_ocr_engine()
     if ocr_engine is None:
         return None
-    
+    if timings is None:
+        timings = {}
+
+    start = time.perf_counter()
     gray, blurred = process_image(img)
+    timings['binarize'] = time.perf_counter() - start
+
+    start = time.perf_counter()
     horizontal_lines, vertical_lines = get_table_structure(blurred)
-    table_data = extract_table(ocr_engine, gray, horizontal_lines, vertical_lines)
+    # Only the gray page is needed from here on.
+    del blurred
+    timings['grid'] = time.perf_counter() - start
+
+    table_data = extract_table(ocr_engine, gray, horizontal_lines, vertical_lines, progress=progress, timings=timings)
     if table_data.empty:
         print("No table data extracted.")
         return None
     
     print("Table data extracted successfully.")
-    return table_data
\ No newline at end of file
+    return table_data
+
+if __name__ == '__main__':
+    # Compare per-page latency of the recognition modes on one image:
+    #   python table_log.py image-table-new.jpg
+    import sys
+
+    image_path = sys.argv[1] if len(sys.argv) > 1 else 'image-table-new.jpg'
+    img = cv2.imread(image_path)
+    if img is None:
+        sys.exit(f"Could not read image {image_path}")
+
+    ocr_engine = config_ocr_engine()
+    gray, blurred = process_image(img)
+    horizontal_lines, vertical_lines = get_table_structure(blurred)
+
+    results = {}
+    for mode in RECOGNITION_MODES:
+        start = time.perf_counter()
+        results[mode] = extract_table(ocr_engine, gray, horizontal_lines, vertical_lines, mode=mode)
+        print(f"{mode:>5}: {time.perf_counter() - start:.2f}s")
+    mismatched = [mode for mode in RECOGNITION_MODES[:-1] if not results[mode].equals(results['cell'])]
+    for mode in RECOGNITION_MODES[:-1]:
+        print(f"{mode} matches cell: {mode not in mismatched}")
+    if mismatched:
+        sys.exit(1)